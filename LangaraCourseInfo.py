@@ -1,103 +1,134 @@
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future
 from datetime import datetime
+import hashlib
+import json
 import os
+from pathlib import Path
 import sqlite3
 import time
+from typing import Iterator
+import zlib
 
+# Scrapers and parsers (selenium, requests, bs4, lxml, pymupdf, pdfquery) are only imported by the methods that use them,
+# so reading the database only needs sqlite3 and the schema
 from schema.Transfer import Transfer
-
-from scrapers.DownloadTransferInfo import TransferScraper
-from scrapers.DownloadLangaraInfo import DownloadAllTermsFromWeb, fetchTermFromWeb
-
-from parsers.AttributesParser import AttributesParser
-from parsers.SemesterParser import parseSemesterHTML
-from parsers.CatalogueParser import CatalogueParser
-from parsers.TransferParser import TransferParser
-
 from schema.Attribute import Attributes
 from schema.Catalogue import Catalogue
-from schema.Semester import Course, ScheduleEntry, Semester
+from schema.Semester import Course, CourseList, ScheduleEntry, Semester, SemesterRecord, dayMask, minutes, scheduleTypes, timeRange
+
+# Names that used to be imported here, they are still importable from this module but only loaded on first use
+_lazy = {
+    "TransferScraper" : ("scrapers.DownloadTransferInfo", "TransferScraper"),
+    "DownloadAllTermsFromWeb" : ("scrapers.DownloadLangaraInfo", "DownloadAllTermsFromWeb"),
+    "fetchTermFromWeb" : ("scrapers.DownloadLangaraInfo", "fetchTermFromWeb"),
+    "fetchSectionShardsFromWeb" : ("scrapers.DownloadLangaraInfo", "fetchSectionShardsFromWeb"),
+    "frozenTerms" : ("scrapers.DownloadLangaraInfo", "frozenTerms"),
+    "AttributesParser" : ("parsers.AttributesParser", "AttributesParser"),
+    "parseSemesterHTML" : ("parsers.SemesterParser", "parseSemesterHTML"),
+    "parseSemesterShards" : ("parsers.SemesterParser", "parseSemesterShards"),
+    "SEMESTER_PARSER_VERSION" : ("parsers.SemesterParser", "PARSER_VERSION"),
+    "CatalogueParser" : ("parsers.CatalogueParser", "CatalogueParser"),
+    "TransferParser" : ("parsers.TransferParser", "TransferParser"),
+}
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    import importlib
+    
+    module, attribute = _lazy[name]
+    value = getattr(importlib.import_module(module), attribute)
+    # later lookups find it in the module and don't come back here
+    globals()[name] = value
+    return value
 
 class Database:
-    def __init__(self, database_name="LangaraCourseInfo.db") -> None:
-        self.connection = sqlite3.connect(database_name)
+    
+    # Secondary indexes (name : table & columns)
+    # They are kept out of createTables so that bulk loads can build them once at the end
+    indexes = {
+        "SectionsCourse" : "Sections (subject, course_code)",
+        "ScheduleInstructor" : "ScheduleData (instructor_id)",
+        "ScheduleRoom" : "ScheduleData (room_id)",
+        "ScheduleStart" : "ScheduleData (yearterm, start_min)",
+        "ScheduleEnd" : "ScheduleData (yearterm, end_min)",
+    }
+    
+    # Repeated strings are stored once in a lookup table (id, value) and referenced by id
+    # column : lookup table
+    lookups = {
+        "type" : "ScheduleTypes",
+        "days" : "ScheduleDays",
+        "time" : "ScheduleTimes",
+        "room" : "Rooms",
+        "instructor" : "Instructors",
+        "destination" : "Institutions",
+    }
+    
+    # Tables holding source files or build bookkeeping, these are never exported
+    source_tables = ["SemesterHTML", "TransferPDF", "TransferText", "ParseLog"]
+    
+    # read_only opens an existing database without creating or changing anything, for processes that only query it
+    def __init__(self, database_name="LangaraCourseInfo.db", read_only=False) -> None:
+        if read_only:
+            self.connection = sqlite3.connect(Path(database_name).absolute().as_uri() + "?mode=ro", uri=True)
+        else:
+            self.connection = sqlite3.connect(database_name)
         self.cursor = self.connection.cursor()
         
-        self.createTables()
+        # set while bulkLoad() is running
+        self.bulk = False
+        
+        # lookup table : {value : id}, filled as ids are looked up
+        self._lookupCache:dict[str, dict[str, int]] = {}
+        
+        if not read_only:
+            self.createTables()
+    
+    # Bump this whenever the layout of the derived tables changes, and add a migration for it in createTables
+    # 1 : year / term columns, untyped tables, every Schedules column in the primary key
+    # 2 : integer yearterm keys (year and term are generated from it), STRICT tables, surrogate ids for Schedules
+    # 3 : repeated schedule and transfer strings moved to lookup tables, Schedules and TransferInformation are views
+    # 4 : day mask and start / end minutes stored for every schedule
+    SCHEMA_VERSION = 4
+    
+    # Columns read by the getters, in the order of the version 1 tables
+    section_columns = "year, term, RP, seats, waitlist, crn, subject, course_code, section, credits, title, additional_fees, repeat_limit, notes"
+    schedule_columns = "year, term, crn, type, days, time, start_date, end_date, room, instructor"
     
     def createTables(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS TransferInformation(
-                subject,
-                course_code,
-                source,
-                destination,
-                credit,
-                effective_start,
-                effective_end,
-                PRIMARY KEY (subject, course_code, source, destination, effective_start, effective_end)
-                );""")
-
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS CourseInfo(
-                subject TEXT,
-                course_code INTEGER,
-                credits REAL,
-                title TEXT,
-                description TEXT,
-                lecture_hours INTEGER,
-                seminar_hours INTEGER,
-                lab_hours INTEGER,
-                AR bool,
-                SC bool,
-                HUM bool,
-                LSC bool,
-                SCI bool,
-                SOC bool,
-                UT bool,
-                PRIMARY KEY (subject, course_code)
-            );""")
-
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Sections(
-                year,
-                term,
-                RP,
-                seats,
-                waitlist,
-                crn,
-                subject,
-                course_code,
-                section,
-                credits,
-                title,
-                additional_fees,
-                repeat_limit,
-                notes,
-                PRIMARY KEY (year, term, crn)
-                );""")
-        
-        # Yes, all those primary keys are neccessary
-        # :/
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Schedules(
-                year,
-                term,
-                crn,
-                type,
-                days,
-                time,
-                start_date,
-                end_date,
-                room,
-                instructor,
-                FOREIGN KEY (year, term, crn) REFERENCES Sections (year, term, crn)
-                PRIMARY KEY (year, term, crn, type, days, time, start_date, end_date, room, instructor)
-                );""")
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        existing = [t[0] for t in self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        
+        if version < 2 and "Sections" in existing:
+            self._migrateFromV1()
+        elif version < 3 and "Sections" in existing:
+            self._migrateFromV2()
+        elif version < 4 and "Sections" in existing:
+            self._migrateFromV3()
+        
+        self._createDerivedTables()
+        
+        self.cursor.execute(f"PRAGMA user_version = {Database.SCHEMA_VERSION}")
+        
+        # The hashes the rebuild compares against ParseLog (see sourceHash) are stored before the files,
+        # so they can be read without reading the files
+        
+        # SemesterHTML and TransferPDF used to be stored without hashes
+        for table in ["SemesterHTML", "TransferPDF"]:
+            columns = [c[1] for c in self.cursor.execute(f"PRAGMA table_info({table})")]
+            if len(columns) > 0 and "section_hash" not in columns and "pdf_hash" not in columns:
+                self.cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
         
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS SemesterHTML(
                 year,
                 term,
+                section_hash TEXT,
+                catalogue_hash TEXT,
                 sectionHTML TEXT,
                 catalogueHTML TEXT,
                 attributeHTML TEXT,
@@ -107,58 +138,520 @@ class Database:
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS TransferPDF(
                 subject TEXT,
+                pdf_hash TEXT,
                 pdf BLOB,
                 PRIMARY KEY (subject)
             );""")
         
+        self._hashOldSourceFiles()
+        
+        # Text extracted from each TransferPDF (see TransferParser.extractText), so PDFs don't have to be decoded on every rebuild
+        # engine is the PDF engine it was extracted with, pdf_hash is the sourceHash of the PDF it was extracted from
+        
+        # TransferText used to only hold text extracted with PyMuPDF, without an engine column
+        columns = [c[1] for c in self.cursor.execute("PRAGMA table_info(TransferText)")]
+        if len(columns) > 0 and "engine" not in columns:
+            self.cursor.execute("ALTER TABLE TransferText RENAME TO TransferText_old")
+        
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS TransferText(
+                subject TEXT,
+                engine TEXT,
+                pdf_hash TEXT,
+                extractor_version INTEGER,
+                text BLOB,
+                agreements INTEGER,
+                courses INTEGER,
+                institutions INTEGER,
+                PRIMARY KEY (subject, engine)
+            );""")
+        
+        if "TransferText_old" in [t[0] for t in self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")]:
+            self.cursor.execute("INSERT INTO TransferText SELECT subject, 'pymupdf', pdf_hash, extractor_version, text, agreements, courses, institutions FROM TransferText_old")
+            self.cursor.execute("DROP TABLE TransferText_old")
+        
+        # Which source file (and which parser version) the parsed data currently in the database came from
+        # source is sections / catalogue (key = yearterm) or transfer (key = subject)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ParseLog(
+                source TEXT,
+                key TEXT,
+                hash TEXT,
+                parser_version TEXT,
+                PRIMARY KEY (source, key)
+            );""")
+        
+        if not self.bulk:
+            self.createIndexes()
+        
+        self._commit()
+    
+    def _createDerivedTables(self):
+        for table in Database.lookups.values():
+            self.cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table}(
+                    id INTEGER PRIMARY KEY,
+                    value TEXT NOT NULL UNIQUE
+                ) STRICT;""")
+        
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS TransferData(
+                subject TEXT NOT NULL,
+                course_code INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                destination_id INTEGER NOT NULL REFERENCES Institutions (id),
+                credit TEXT,
+                effective_start TEXT,
+                effective_end TEXT,
+                -- not a primary key, STRICT tables don't allow NULLs in those and effective_end can be NULL
+                UNIQUE (subject, course_code, source, destination_id, effective_start, effective_end)
+            ) STRICT;""")
+        
+        self.cursor.execute("""
+            CREATE VIEW IF NOT EXISTS TransferInformation AS
+            SELECT t.subject, t.course_code, t.source, i.value AS destination, t.credit, t.effective_start, t.effective_end
+            FROM TransferData t
+            JOIN Institutions i ON i.id = t.destination_id;""")
+
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS CourseInfo(
+                subject TEXT NOT NULL,
+                course_code INTEGER NOT NULL,
+                credits REAL,
+                title TEXT,
+                description TEXT,
+                lecture_hours REAL,
+                seminar_hours REAL,
+                lab_hours REAL,
+                AR INTEGER,
+                SC INTEGER,
+                HUM INTEGER,
+                LSC INTEGER,
+                SCI INTEGER,
+                SOC INTEGER,
+                UT INTEGER,
+                PRIMARY KEY (subject, course_code)
+            ) WITHOUT ROWID, STRICT;""")
+        
+        # yearterm is e.g. 202330, year and term are generated from it so older queries still work
+        # seats and waitlist are either a number or a status like "Inact" / "Full"
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Sections(
+                yearterm INTEGER NOT NULL,
+                year INTEGER GENERATED ALWAYS AS (yearterm / 100) VIRTUAL,
+                term INTEGER GENERATED ALWAYS AS (yearterm % 100) VIRTUAL,
+                RP TEXT,
+                seats ANY,
+                waitlist ANY,
+                crn INTEGER NOT NULL,
+                subject TEXT,
+                course_code INTEGER,
+                section TEXT,
+                credits REAL,
+                title TEXT,
+                additional_fees REAL,
+                repeat_limit INTEGER,
+                notes TEXT,
+                fingerprint TEXT,
+                PRIMARY KEY (yearterm, crn)
+            ) WITHOUT ROWID, STRICT;""")
+        
+        # seq is the position of the schedule in its section, identical schedules are only stored once
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ScheduleData(
+                id INTEGER PRIMARY KEY,
+                yearterm INTEGER NOT NULL,
+                crn INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                type_id INTEGER REFERENCES ScheduleTypes (id),
+                days_id INTEGER REFERENCES ScheduleDays (id),
+                time_id INTEGER REFERENCES ScheduleTimes (id),
+                start_date TEXT,
+                end_date TEXT,
+                room_id INTEGER REFERENCES Rooms (id),
+                instructor_id INTEGER REFERENCES Instructors (id),
+                day_mask INTEGER,
+                start_min INTEGER,
+                end_min INTEGER,
+                UNIQUE (yearterm, crn, seq),
+                FOREIGN KEY (yearterm, crn) REFERENCES Sections (yearterm, crn)
+            ) STRICT;""")
+        
+        self.cursor.execute("""
+            CREATE VIEW IF NOT EXISTS Schedules AS
+            SELECT s.id, s.yearterm, s.yearterm / 100 AS year, s.yearterm % 100 AS term, s.crn, s.seq,
+                ty.value AS type, d.value AS days, ti.value AS time, s.start_date, s.end_date, r.value AS room, i.value AS instructor,
+                s.day_mask, s.start_min, s.end_min
+            FROM ScheduleData s
+            LEFT JOIN ScheduleTypes ty ON ty.id = s.type_id
+            LEFT JOIN ScheduleDays d ON d.id = s.days_id
+            LEFT JOIN ScheduleTimes ti ON ti.id = s.time_id
+            LEFT JOIN Rooms r ON r.id = s.room_id
+            LEFT JOIN Instructors i ON i.id = s.instructor_id;""")
+    
+    # Drops every table built from the source files
+    def dropDerivedTables(self):
+        for view in ["Schedules", "TransferInformation"]:
+            self.cursor.execute(f"DROP VIEW IF EXISTS {view}")
+        
+        for table in ["Sections", "ScheduleData", "CourseInfo", "TransferData", *Database.lookups.values()]:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        
+        self._lookupCache.clear()
+    
+    # Migrations move the derived tables of an older database into the current layout, each in one transaction
+    @contextmanager
+    def _migration(self, version, tables):
+        print(f"Migrating database from schema version {version} to {Database.SCHEMA_VERSION}...")
+        
+        self.connection.commit()
+        self.cursor.execute("BEGIN")
+        
+        try:
+            self.dropIndexes()
+            
+            for table in tables:
+                self.cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_v{version}")
+            
+            # views are recreated with the current columns
+            for view in ["Schedules", "TransferInformation"]:
+                self.cursor.execute(f"DROP VIEW IF EXISTS {view}")
+            
+            self._createDerivedTables()
+            yield
+            
+            for table in tables:
+                self.cursor.execute(f"DROP TABLE {table}_v{version}")
+            
+            self.cursor.execute(f"PRAGMA user_version = {Database.SCHEMA_VERSION}")
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            self._lookupCache.clear()
+            raise
+        
+        # give the space used by the old tables back
+        self.cursor.execute("VACUUM")
+    
+    def _migrateFromV1(self):
+        with self._migration(1, ["TransferInformation", "CourseInfo", "Sections", "Schedules"]):
+            # very old databases don't have a fingerprint yet, those sections are written again the next time their term is parsed
+            columns = [c[1] for c in self.cursor.execute("PRAGMA table_info(Sections_v1)")]
+            fingerprint = "fingerprint" if "fingerprint" in columns else "NULL"
+            
+            self.cursor.execute(f"""
+                INSERT INTO Sections (yearterm, RP, seats, waitlist, crn, subject, course_code, section, credits, title, additional_fees, repeat_limit, notes, fingerprint)
+                SELECT year * 100 + term, RP, seats, waitlist, crn, subject, course_code, section, credits, title, additional_fees, repeat_limit, notes, {fingerprint}
+                FROM Sections_v1""")
+            
+            self._copyEncoded("Schedules_v1", "TransferInformation_v1", "year * 100 + term", "ROW_NUMBER() OVER (PARTITION BY year, term, crn ORDER BY rowid) - 1", "NULL")
+            
+            self.cursor.execute("INSERT INTO CourseInfo SELECT * FROM CourseInfo_v1")
+    
+    def _migrateFromV2(self):
+        with self._migration(2, ["TransferInformation", "Schedules"]):
+            self._copyEncoded("Schedules_v2", "TransferInformation_v2", "yearterm", "seq", "id")
+    
+    def _migrateFromV3(self):
+        with self._migration(3, []):
+            for column in ["day_mask", "start_min", "end_min"]:
+                self.cursor.execute(f"ALTER TABLE ScheduleData ADD COLUMN {column} INTEGER")
+            self._fillScheduleTimes()
+    
+    # Computes day_mask, start_min and end_min from the days and time of every schedule
+    # Days and times are only parsed once per distinct value in their lookup table
+    def _fillScheduleTimes(self):
+        masks = [(dayMask(days), id) for id, days in self.cursor.execute("SELECT id, value FROM ScheduleDays").fetchall()]
+        times = [(*timeRange(time), id) for id, time in self.cursor.execute("SELECT id, value FROM ScheduleTimes").fetchall()]
+        
+        self.cursor.execute("CREATE TEMP TABLE DayMasks (mask INTEGER, id INTEGER PRIMARY KEY)")
+        self.cursor.execute("CREATE TEMP TABLE TimeRanges (start_min INTEGER, end_min INTEGER, id INTEGER PRIMARY KEY)")
+        self.cursor.executemany("INSERT INTO DayMasks VALUES(?, ?)", masks)
+        self.cursor.executemany("INSERT INTO TimeRanges VALUES(?, ?, ?)", times)
+        
+        self.cursor.execute("""
+            UPDATE ScheduleData SET
+                day_mask = (SELECT mask FROM DayMasks WHERE id = days_id),
+                start_min = (SELECT start_min FROM TimeRanges WHERE id = time_id),
+                end_min = (SELECT end_min FROM TimeRanges WHERE id = time_id)""")
+        
+        self.cursor.execute("DROP TABLE temp.DayMasks")
+        self.cursor.execute("DROP TABLE temp.TimeRanges")
+    
+    # Copies schedules and transfers from tables with the strings inline into ScheduleData / TransferData
+    def _copyEncoded(self, schedules, transfers, yearterm, seq, id):
+        for column, table in Database.lookups.items():
+            source = transfers if column == "destination" else schedules
+            self.cursor.execute(f"INSERT OR IGNORE INTO {table} (value) SELECT DISTINCT {column} FROM {source} WHERE {column} IS NOT NULL")
+        
+        self.cursor.execute(f"""
+            INSERT INTO ScheduleData (id, yearterm, crn, seq, type_id, days_id, time_id, start_date, end_date, room_id, instructor_id)
+            SELECT {id}, {yearterm}, s.crn, {seq},
+                (SELECT id FROM ScheduleTypes WHERE value = s.type),
+                (SELECT id FROM ScheduleDays WHERE value = s.days),
+                (SELECT id FROM ScheduleTimes WHERE value = s.time),
+                s.start_date, s.end_date,
+                (SELECT id FROM Rooms WHERE value = s.room),
+                (SELECT id FROM Instructors WHERE value = s.instructor)
+            FROM {schedules} s""")
+        
+        self.cursor.execute(f"""
+            INSERT INTO TransferData (subject, course_code, source, destination_id, credit, effective_start, effective_end)
+            SELECT t.subject, t.course_code, t.source, (SELECT id FROM Institutions WHERE value = t.destination), t.credit, t.effective_start, t.effective_end
+            FROM {transfers} t""")
+        
+        self._fillScheduleTimes()
+    
+    # id of a value in a lookup table, adding it if it isn't there yet
+    def _lookupId(self, table, value) -> int | None:
+        if value is None:
+            return None
+        
+        if table not in self._lookupCache:
+            self._lookupCache[table] = dict(self.cursor.execute(f"SELECT value, id FROM {table}").fetchall())
+        
+        cache = self._lookupCache[table]
+        if value not in cache:
+            self.cursor.execute(f"INSERT INTO {table} (value) VALUES(?)", (value,))
+            cache[value] = self.cursor.lastrowid
+        
+        return cache[value]
+    
+    def createIndexes(self):
+        for name, on in Database.indexes.items():
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {on}")
+    
+    def dropIndexes(self):
+        for name in Database.indexes:
+            self.cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    
+    # Commit now, unless a bulk load is running in which case everything is committed when it finishes
+    def _commit(self):
+        if not self.bulk:
+            self.connection.commit()
+    
+    # Runs everything inside the with block as one transaction, with settings tuned for bulk writes:
+    # WAL journal, no fsyncs, a bigger page cache and temp tables kept in memory.
+    # Secondary indexes are dropped and rebuilt once at the end.
+    # If anything fails the whole load is rolled back.
+    # Nested bulk loads join the outer one.
+    @contextmanager
+    def bulkLoad(self, cache_size_kb=65536):
+        if self.bulk:
+            yield self
+            return
         
         self.connection.commit()
+        
+        previous = {}
+        for pragma in ["journal_mode", "synchronous", "cache_size", "temp_store"]:
+            previous[pragma] = self.cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+        
+        self.cursor.execute("PRAGMA journal_mode = WAL")
+        self.cursor.execute("PRAGMA synchronous = OFF")
+        self.cursor.execute(f"PRAGMA cache_size = -{int(cache_size_kb)}")
+        self.cursor.execute("PRAGMA temp_store = MEMORY")
+        
+        self.cursor.execute("BEGIN")
+        self.bulk = True
+        
+        try:
+            self.dropIndexes()
+            yield self
+            self.createIndexes()
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            # ids added during the load were rolled back too
+            self._lookupCache.clear()
+            raise
+        finally:
+            self.bulk = False
+            
+            for pragma, value in previous.items():
+                self.cursor.execute(f"PRAGMA {pragma} = {value}")
     
     #def insertMultipleSemesterHTML(self, html:list[tuple[int, int, str]]):
     #    for term in html:
     #        self.insert_SemesterHTML(term[0], term[1], term[2])
     
+    # HTML and PDFs are stored zlib compressed, with this prefix so that uncompressed rows from older databases can still be read
+    COMPRESSED = b"LCI-zlib:"
+    
+    def _compress(data:str | bytes | None) -> bytes | None:
+        if data is None:
+            return None
+        if isinstance(data, str):
+            data = data.encode()
+        return Database.COMPRESSED + zlib.compress(data, 6)
+    
+    def _decompress(data:str | bytes | None, text=True) -> str | bytes | None:
+        if not isinstance(data, bytes) or not data.startswith(Database.COMPRESSED):
+            return data
+        
+        data = zlib.decompress(data[len(Database.COMPRESSED):])
+        if text:
+            data = data.decode()
+        return data
+    
+    def _decompressHTML(row:tuple) -> tuple:
+        return row[:-3] + tuple(Database._decompress(html) for html in row[-3:])
+    
+    # The hashes the rebuild compares against ParseLog are computed here once, so a rebuild doesn't have to read the HTML to find out nothing changed
     def insertLangaraHTML(self, year:int, term:int, sectionHTML, catalogueHTML, attributeHTML):
         # TODO: why does this need to be tupled twice?
-        data = (year, term, sectionHTML, catalogueHTML, attributeHTML)
-        self.cursor.execute("INSERT OR REPLACE INTO SemesterHTML VALUES(?, ?, ?, ?, ?)", data)
-        self.connection.commit()
+        data = (year, term, sourceHash(sectionHTML), sourceHash(catalogueHTML, attributeHTML), Database._compress(sectionHTML), Database._compress(catalogueHTML), Database._compress(attributeHTML))
+        self.cursor.execute("INSERT OR REPLACE INTO SemesterHTML VALUES(?, ?, ?, ?, ?, ?, ?)", data)
+        self._commit()
         
         #print(f"Saved HTML for {year}{term}.")
         
     def getSemesterHTML(self, year, term) -> tuple[str, str, str]:
         self.cursor.execute("SELECT sectionHTML, catalogueHTML, attributeHTML FROM SemesterHTML WHERE year = ? AND term = ?", (year, term))
-        return self.cursor.fetchone()
+        html = self.cursor.fetchone()
+        
+        if html is None:
+            return None
+        return Database._decompressHTML(html)
 
     # Guaranteed to be sorted from newest to oldest
     def getAllLangaraHTML(self) -> list[tuple[int, int, str, str, str]]:
-        self.cursor.execute("SELECT * FROM SemesterHTML ORDER BY year DESC, term DESC")
-        return self.cursor.fetchall()
-
-    def insertSemester(self, semester: Semester):
-        section = []
-        for c in semester.courses:
-            section.append((semester.year, semester.term, c.RP, c.seats, c.waitlist, c.crn, c.subject, c.course_code, c.section, c.credits, c.title, c.add_fees, c.rpt_limit, c.notes))
+        self.cursor.execute("SELECT year, term, sectionHTML, catalogueHTML, attributeHTML FROM SemesterHTML ORDER BY year DESC, term DESC")
+        return [Database._decompressHTML(html) for html in self.cursor.fetchall()]
+    
+    # (year, term) -> (section hash, catalogue hash) of every stored term, see sourceHash
+    def getLangaraHTMLHashes(self) -> dict[tuple[int, int], tuple[str, str]]:
+        hashes = self.cursor.execute("SELECT year, term, section_hash, catalogue_hash FROM SemesterHTML").fetchall()
+        return {(year, term) : (section_hash, catalogue_hash) for year, term, section_hash, catalogue_hash in hashes}
+    
+    # Every (year, term) that has HTML stored
+    def getStoredTerms(self) -> set[tuple[int, int]]:
+        return set(self.cursor.execute("SELECT year, term FROM SemesterHTML").fetchall())
+    
+    # Same order as getAllLangaraHTML, but only holds one term in memory at a time
+    # Only the (year, term) keys are fetched up front, each term's HTML is read when it is needed
+    # terms limits this to a list of (year, term)
+    def iterLangaraHTML(self, terms:list[tuple[int, int]] = None) -> Iterator[tuple[int, int, str, str, str]]:
+        keys = self.connection.execute("SELECT year, term FROM SemesterHTML ORDER BY year DESC, term DESC").fetchall()
         
-        self.cursor.executemany("INSERT OR REPLACE INTO Sections VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", section)
-        self.connection.commit()
+        if terms is not None:
+            terms = set(terms)
+            keys = [k for k in keys if k in terms]
         
+        for year, term in keys:
+            html = self.connection.execute("SELECT year, term, sectionHTML, catalogueHTML, attributeHTML FROM SemesterHTML WHERE year = ? AND term = ?", (year, term)).fetchone()
+            if html is not None:
+                yield Database._decompressHTML(html)
+
+    # Only sections whose fingerprint changed are written
+    # Returns how many sections were (inserted, updated, unchanged)
+    # semester can be a Semester or a SemesterRecord
+    def insertSemester(self, semester: Semester | SemesterRecord) -> tuple[int, int, int]:
+        counts = self._writeSemester(semester)
+        self._commit()
+        return counts
+    
+    # insertSemester without the commit, so callers can delete sections in the same transaction
+    def _writeSemester(self, semester: Semester | SemesterRecord) -> tuple[int, int, int]:
+        yearterm = semester.year * 100 + semester.term
+        stored = dict(self.cursor.execute("SELECT crn, fingerprint FROM Sections WHERE yearterm=?", (yearterm,)).fetchall())
         
-        # Must delete old schedules because sometimes the SIS does that
-        delete = []
-        for c in semester.courses:
-            delete.append((semester.year, semester.term, c.crn))
-        self.cursor.executemany("DELETE FROM Schedules WHERE year=? AND term=? AND crn=?", delete)
-        self.connection.commit()
+        inserted = 0
+        updated = 0
+        unchanged = 0
         
-        # Re add all schedules
+        section = []
+        delete = []
         sched = []
+        written = set()
+        
+        # schedules already written for each CRN, so duplicates are only stored once
+        schedules:dict[int, set[tuple]] = {}
+        
         for c in semester.courses:
+            fingerprint = Database._sectionFingerprint(c)
+            
+            if c.crn in written:
+                # the same CRN twice in one page, write it again like any other change
+                pass
+            elif c.crn not in stored:
+                inserted += 1
+            elif stored[c.crn] != fingerprint:
+                # Must delete old schedules because sometimes the SIS does that
+                updated += 1
+                delete.append((yearterm, c.crn))
+            else:
+                unchanged += 1
+                continue
+            
+            written.add(c.crn)
+            section.append((yearterm, c.RP, c.seats, c.waitlist, c.crn, c.subject, c.course_code, c.section, c.credits, c.title, c.add_fees, c.rpt_limit, c.notes, fingerprint))
+            
+            seen = schedules.setdefault(c.crn, set())
             for s in c.schedule:
-                sched.append((semester.year, semester.term, c.crn, s.type.value, s.days, s.time, s.start, s.end, s.room, s.instructor))
+                key = s.key()
+                if key in seen:
+                    continue
                 
-        self.cursor.executemany("INSERT OR REPLACE INTO Schedules VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", sched)
-        self.connection.commit()
+                sched.append((
+                    yearterm, c.crn, len(seen), 
+                    self._lookupId("ScheduleTypes", s.type.value), self._lookupId("ScheduleDays", s.days), self._lookupId("ScheduleTimes", s.time), 
+                    s.start, s.end, 
+                    self._lookupId("Rooms", s.room), self._lookupId("Instructors", s.instructor),
+                    dayMask(s.days), *timeRange(s.time),
+                ))
+                seen.add(key)
+        
+        self.cursor.executemany("""
+            INSERT OR REPLACE INTO Sections (yearterm, RP, seats, waitlist, crn, subject, course_code, section, credits, title, additional_fees, repeat_limit, notes, fingerprint)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", section)
+        self.cursor.executemany("DELETE FROM ScheduleData WHERE yearterm=? AND crn=?", delete)
+        self.cursor.executemany("""
+            INSERT OR REPLACE INTO ScheduleData (yearterm, crn, seq, type_id, days_id, time_id, start_date, end_date, room_id, instructor_id, day_mask, start_min, end_min)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", sched)
+        
+        return inserted, updated, unchanged
+    
+    # Deletes every section and schedule of a term
+    def deleteSemester(self, year, term):
+        self.cursor.execute("DELETE FROM Sections WHERE yearterm=?", (year * 100 + term,))
+        self.cursor.execute("DELETE FROM ScheduleData WHERE yearterm=?", (year * 100 + term,))
+        self._commit()
+    
+    # Like insertSemester, but sections that are no longer in the semester are deleted, in the same commit
+    def replaceSemester(self, semester: Semester | SemesterRecord) -> tuple[int, int, int]:
+        counts = self._writeSemester(semester)
+        
+        yearterm = semester.year * 100 + semester.term
+        stored = self.cursor.execute("SELECT crn FROM Sections WHERE yearterm=?", (yearterm,)).fetchall()
+        self._deleteMissing(yearterm, stored, semester)
+        self._commit()
+        
+        return counts
+    
+    # replaceSemester for a semester that only holds the sections of some subjects
+    # Stored sections of those subjects that aren't in it anymore are deleted, every other subject is left alone
+    def replaceSubjects(self, semester: Semester | SemesterRecord, subjects:list[str]) -> tuple[int, int, int]:
+        counts = self._writeSemester(semester)
+        
+        yearterm = semester.year * 100 + semester.term
+        stored = self.cursor.execute(f"SELECT crn FROM Sections WHERE yearterm=? AND subject IN ({', '.join('?' * len(subjects))})", (yearterm, *subjects)).fetchall()
+        self._deleteMissing(yearterm, stored, semester)
+        self._commit()
+        
+        return counts
+    
+    def _deleteMissing(self, yearterm, stored:list[tuple[int]], semester: Semester | SemesterRecord):
+        crns = set(c.crn for c in semester.courses)
+        
+        delete = [(yearterm, crn) for (crn,) in stored if crn not in crns]
+        self.cursor.executemany("DELETE FROM Sections WHERE yearterm=? AND crn=?", delete)
+        self.cursor.executemany("DELETE FROM ScheduleData WHERE yearterm=? AND crn=?", delete)
+    
+    # Hash of a section and all of its schedules, used to skip rewriting sections that haven't changed
+    def _sectionFingerprint(c:Course) -> str:
+        schedules = sorted(json.dumps(s) for s in c.scheduleKeys())
+        return hashlib.sha1(json.dumps([c.key(), schedules]).encode()).hexdigest()
     
     def insertCatalogueAttributes(self, catalogue:Catalogue, attributes:Attributes):
         data = []
@@ -183,33 +676,163 @@ class Database:
         
         self.cursor.executemany("UPDATE CourseInfo SET AR=?, SC=?, HUM=?, LSC=?, SCI=?, SOC=?, UT=? WHERE subject=? AND course_code=?", data)
 
-        self.connection.commit()
+        self._commit()
     
     def insertTransfers(self, transfers:list[Transfer]):
+        self._insertTransferData(transfers)
+        self._commit()
+    
+    def deleteTransfers(self, subject):
+        self.cursor.execute("DELETE FROM TransferData WHERE subject=?", (subject,))
+        self._commit()
+    
+    # Replaces every transfer of a subject in one commit
+    def replaceTransfers(self, subject, transfers:list[Transfer]):
+        self.cursor.execute("DELETE FROM TransferData WHERE subject=?", (subject,))
+        self._insertTransferData(transfers)
+        self._commit()
+    
+    def _insertTransferData(self, transfers:list[Transfer]):
         data = []
         for t in transfers:
-            data.append((t.subject, t.course_code, t.source, t.destination, t.credit, t.effective_start, t.effective_end))
+            data.append((t.subject, t.course_code, t.source, self._lookupId("Institutions", t.destination), t.credit, t.effective_start, t.effective_end))
         
-        self.cursor.executemany("INSERT OR REPLACE INTO TransferInformation VALUES(?, ?, ?, ?, ?, ?, ?)", data)
-        self.connection.commit()
+        self.cursor.executemany("INSERT OR REPLACE INTO TransferData VALUES(?, ?, ?, ?, ?, ?, ?)", data)
     
-    def insertTransferPDF(self, subject, bytes):
-        data = (subject, bytes)
-        self.cursor.execute("INSERT OR REPLACE INTO TransferPDF VALUES(?, ?)", data)
-        self.connection.commit()
+    # text is the text extracted from the pdf with engine, if it is given it is cached in TransferText
+    def insertTransferPDF(self, subject, bytes, text:list[str] = None, engine="pdfquery"):
+        pdf_hash = sourceHash(bytes)
+        data = (subject, pdf_hash, Database._compress(bytes))
+        self.cursor.execute("INSERT OR REPLACE INTO TransferPDF VALUES(?, ?, ?)", data)
+        
+        if text is not None:
+            from parsers.TransferParser import TransferParser
+            self.insertTransferText(subject, engine, pdf_hash, text, *TransferParser.headerCounts(text))
+        
+        self._commit()
     
     def getAllTransferPDF(self) -> list[tuple[str, bytes]]:
-        self.cursor.execute("SELECT * FROM TransferPDF")
-        return self.cursor.fetchall()
+        self.cursor.execute("SELECT subject, pdf FROM TransferPDF")
+        return [(subject, Database._decompress(pdf, text=False)) for subject, pdf in self.cursor.fetchall()]
+    
+    # subject -> sourceHash of its PDF
+    def getTransferPDFHashes(self) -> dict[str, str]:
+        return dict(self.cursor.execute("SELECT subject, pdf_hash FROM TransferPDF").fetchall())
+    
+    # Same as getAllTransferPDF, but only one PDF is held in memory at a time
+    def iterTransferPDF(self, subjects:list[str] = None) -> Iterator[tuple[str, bytes]]:
+        keys = [k[0] for k in self.connection.execute("SELECT subject FROM TransferPDF ORDER BY subject").fetchall()]
+        
+        if subjects is not None:
+            subjects = set(subjects)
+            keys = [k for k in keys if k in subjects]
+        
+        for subject in keys:
+            pdf = self.connection.execute("SELECT pdf FROM TransferPDF WHERE subject = ?", (subject,)).fetchone()
+            if pdf is not None:
+                yield subject, Database._decompress(pdf[0], text=False)
+    
+    # text is the list of text boxes engine extracted from the pdf
+    def insertTransferText(self, subject, engine, pdf_hash, text:list[str], agreements:int, courses:int, institutions:int):
+        from parsers.TransferParser import TransferParser
+        
+        data = (subject, engine, pdf_hash, TransferParser.EXTRACTOR_VERSION, Database._compress(json.dumps(text)), agreements, courses, institutions)
+        self.cursor.execute("INSERT OR REPLACE INTO TransferText VALUES(?, ?, ?, ?, ?, ?, ?, ?)", data)
+        self._commit()
+    
+    # Returns the text boxes engine extracted from a subject's PDF, or None if there is no text cached for that exact PDF and engine
+    def getTransferText(self, subject, engine, pdf_hash) -> list[str] | None:
+        from parsers.TransferParser import TransferParser
+        
+        text = self.cursor.execute("SELECT text FROM TransferText WHERE subject=? AND engine=? AND pdf_hash=? AND extractor_version=?", (subject, engine, pdf_hash, TransferParser.EXTRACTOR_VERSION)).fetchone()
+        if text is None:
+            return None
+        return json.loads(Database._decompress(text[0]))
+    
+    # subject -> (agreements, courses, institutions)
+    def getTransferCounts(self) -> dict[str, tuple[int, int, int]]:
+        # when both engines have text cached, the counts pdfquery read win
+        counts = self.cursor.execute("SELECT subject, agreements, courses, institutions FROM TransferText ORDER BY engine = 'pdfquery'").fetchall()
+        return {c[0] : c[1:] for c in counts}
+    
+    def deleteTransferText(self, subject):
+        self.cursor.execute("DELETE FROM TransferText WHERE subject=?", (subject,))
+        self._commit()
+    
+    # Copies files from SemesterHTML / TransferPDF tables without hashes into the current tables, hashing each file once
+    # The files are copied as they are stored, compressed or not
+    def _hashOldSourceFiles(self):
+        existing = [t[0] for t in self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        
+        if "SemesterHTML_old" in existing:
+            keys = self.cursor.execute("SELECT year, term FROM SemesterHTML_old").fetchall()
+            for year, term in keys:
+                html = self.cursor.execute("SELECT sectionHTML, catalogueHTML, attributeHTML FROM SemesterHTML_old WHERE year = ? AND term = ?", (year, term)).fetchone()
+                sectionHTML, catalogueHTML, attributeHTML = Database._decompressHTML(html)
+                
+                data = (year, term, sourceHash(sectionHTML), sourceHash(catalogueHTML, attributeHTML), *html)
+                self.cursor.execute("INSERT INTO SemesterHTML VALUES(?, ?, ?, ?, ?, ?, ?)", data)
+            
+            self.cursor.execute("DROP TABLE SemesterHTML_old")
+        
+        if "TransferPDF_old" in existing:
+            subjects = self.cursor.execute("SELECT subject FROM TransferPDF_old").fetchall()
+            for (subject,) in subjects:
+                pdf = self.cursor.execute("SELECT pdf FROM TransferPDF_old WHERE subject = ?", (subject,)).fetchone()[0]
+                self.cursor.execute("INSERT INTO TransferPDF VALUES(?, ?, ?)", (subject, sourceHash(Database._decompress(pdf, text=False)), pdf))
+            
+            self.cursor.execute("DROP TABLE TransferPDF_old")
+    
+    # Compresses any HTML or PDFs that were stored before compression was added, then shrinks the file
+    # Only needs to be run once on an old database
+    def compressStoredFiles(self):
+        keys = self.cursor.execute("SELECT year, term FROM SemesterHTML").fetchall()
+        for year, term in keys:
+            html = self.cursor.execute("SELECT sectionHTML, catalogueHTML, attributeHTML FROM SemesterHTML WHERE year = ? AND term = ?", (year, term)).fetchone()
+            
+            if all(h is None or (isinstance(h, bytes) and h.startswith(Database.COMPRESSED)) for h in html):
+                continue
+            
+            self.insertLangaraHTML(year, term, *Database._decompressHTML(html))
+        
+        subjects = self.cursor.execute("SELECT subject FROM TransferPDF").fetchall()
+        for (subject,) in subjects:
+            pdf = self.cursor.execute("SELECT pdf FROM TransferPDF WHERE subject = ?", (subject,)).fetchone()[0]
+            
+            if pdf is None or pdf.startswith(Database.COMPRESSED):
+                continue
+            
+            self.insertTransferPDF(subject, pdf)
+        
+        self.connection.commit()
+        self.connection.execute("VACUUM")
+    
+    # key -> (hash, parser_version) for everything parsed from a source
+    def getParseLog(self, source) -> dict[str, tuple[str, str]]:
+        log = self.cursor.execute("SELECT key, hash, parser_version FROM ParseLog WHERE source=?", (source,)).fetchall()
+        return {key : (hash, version) for key, hash, version in log}
+    
+    def setParseLog(self, source, key, hash, parser_version):
+        self.cursor.execute("INSERT OR REPLACE INTO ParseLog VALUES(?, ?, ?, ?)", (source, str(key), hash, str(parser_version)))
+        self._commit()
+    
+    def clearParseLog(self, source=None, key=None):
+        if source is None:
+            self.cursor.execute("DELETE FROM ParseLog")
+        elif key is None:
+            self.cursor.execute("DELETE FROM ParseLog WHERE source=?", (source,))
+        else:
+            self.cursor.execute("DELETE FROM ParseLog WHERE source=? AND key=?", (source, str(key)))
+        self._commit()
     
     def getSection(self, year, term, crn) -> Course | None:
-        c = self.cursor.execute("SELECT * FROM Sections WHERE year=? AND term=? AND crn=?", (year, term, crn))
+        c = self.cursor.execute(f"SELECT {Database.section_columns} FROM Sections WHERE yearterm=? AND crn=?", (year * 100 + term, crn))
         c = c.fetchone()
         
         if c is None:
             return None
         
-        c = Course(RP=c[2], seats=c[3], waitlist=c[4], crn=c[5], subject=c[6], course_code=c[7], section=c[8], credits=c[9], title=c[10], add_fees=c[11], rpt_limit=c[12], notes=c[13], schedule=[])
+        c = Database._sectionFromRow(c)
         
         c.schedule = self.getSchedules(year, term, c.crn)
         
@@ -219,7 +842,7 @@ class Database:
      
     
     def getSchedules(self, year, term, crn) -> ScheduleEntry | None:
-        s_db = self.cursor.execute("SELECT * FROM Schedules WHERE year=? AND term=? AND crn=? ORDER BY type DESC", (year, term, crn))
+        s_db = self.cursor.execute(f"SELECT {Database.schedule_columns} FROM Schedules WHERE yearterm=? AND crn=? ORDER BY type DESC, seq", (year * 100 + term, crn))
         s_db = s_db.fetchall()
                         
         if s_db is None:
@@ -228,12 +851,425 @@ class Database:
         scheds:list[ScheduleEntry] = []
         for s in s_db:
                         
-            scheds.append(ScheduleEntry(type=s[3], days=s[4], time=s[5], start=s[6], end=s[7], room=s[8], instructor=s[9]))
+            scheds.append(Database._scheduleFromRow(s))
         return scheds
     
+    # Loads every section in a term with their schedules, keyed by CRN
+    # Only two queries no matter how many sections there are
+    def getSections(self, year, term) -> dict[int, Course]:
+        return self._loadSections(year * 100 + term)
+    
+    # Sections in a term with at least one schedule that matches every filter given, keyed by CRN like getSections
+    # The filters run in SQL on the day_mask, start_min, end_min and start_date / end_date columns
+    # days : days the session meets on, e.g. "TR", "-T-R---" or a day mask. By default it has to meet on all of them, any_day=True matches sessions that meet on at least one
+    # start_after / end_before : "1600" or minutes since midnight, inclusive
+    # on_date : ISO date (YYYY-MM-DD) the session is running on
+    # e.g. sections meeting on Tuesdays after 4pm: findSections(2023, 30, days="T", start_after="1600")
+    def findSections(self, year, term, days:str | int = None, any_day=False, start_after:str | int = None, end_before:str | int = None, on_date:str = None) -> dict[int, Course]:
+        where = ["yearterm=?"]
+        params = [year * 100 + term]
+        
+        if days is not None:
+            mask = days if isinstance(days, int) else dayMask(days)
+            if any_day:
+                where.append("day_mask & ? != 0")
+                params.append(mask)
+            else:
+                where.append("day_mask & ? = ?")
+                params.extend([mask, mask])
+        
+        if start_after is not None:
+            where.append("start_min >= ?")
+            params.append(start_after if isinstance(start_after, int) else minutes(start_after))
+        
+        if end_before is not None:
+            where.append("end_min <= ?")
+            params.append(end_before if isinstance(end_before, int) else minutes(end_before))
+        
+        if on_date is not None:
+            where.append("start_date <= ? AND end_date >= ?")
+            params.extend([on_date, on_date])
+        
+        return self._loadSections(year * 100 + term, f" AND crn IN (SELECT crn FROM ScheduleData WHERE {' AND '.join(where)})", params)
     
+    # filter is appended to the WHERE clause of both queries, so it can only use the crn column
+    def _loadSections(self, yearterm, filter="", params=()) -> dict[int, Course]:
+        sections:dict[int, Course] = {}
+        
+        for c in self.connection.execute(f"SELECT {Database.section_columns} FROM Sections WHERE yearterm=?{filter}", (yearterm, *params)):
+            sections[c[5]] = Database._sectionFromRow(c)
+        
+        for s in self.connection.execute(f"SELECT {Database.schedule_columns} FROM Schedules WHERE yearterm=?{filter} ORDER BY type DESC, seq", (yearterm, *params)):
+            if s[2] in sections:
+                sections[s[2]].schedule.append(Database._scheduleFromRow(s))
+        
+        return sections
+    
+    # Rows in our own database were validated before they were written, so the models are built without validating them again
+    def _sectionFromRow(c) -> Course:
+        return Course.model_construct(RP=c[2], seats=c[3], waitlist=c[4], crn=c[5], subject=c[6], course_code=c[7], section=c[8], credits=c[9], title=c[10], add_fees=c[11], rpt_limit=c[12], notes=c[13], schedule=[])
+    
+    def _scheduleFromRow(s) -> ScheduleEntry:
+        return ScheduleEntry.model_construct(type=scheduleTypes(s[3]), days=s[4], time=s[5], start=s[6], end=s[7], room=s[8], instructor=s[9])
+    
+    
+
+
+
+
+# Parses the stored HTML for a single term into its semester, catalogue and attributes
+# Any HTML that is None is skipped and comes back as None
+# This lives at module level so that it can be sent to worker processes
+def parseStoredTerm(term:tuple[int, int, str | None, str | None, str | None], engine="bs4") -> tuple[SemesterRecord | None, Catalogue | None, Attributes | None]:
+    from parsers.AttributesParser import AttributesParser
+    from parsers.CatalogueParser import CatalogueParser
+    from parsers.SemesterParser import parseSemesterHTML
+    
+    semester = None
+    catalogue = None
+    attributes = None
+    
+    if term[2] is not None:
+        # the rebuild only writes the sections to the database, so skip the pydantic models
+        semester = parseSemesterHTML(term[2], engine, records=True)
+    
+    if term[3] is not None:
+        catalogue = Catalogue()
+        CatalogueParser.parseCatalogue(term[3], catalogue)
+    
+    if term[4] is not None:
+        attributes = Attributes()
+        AttributesParser.parseHTML(term[4], attributes)
+    
+    return semester, catalogue, attributes
 
+# Hash of the contents of a stored source file, used to tell if it has changed since it was parsed
+def sourceHash(*parts:str | bytes | None) -> str:
+    h = hashlib.sha1()
+    for p in parts:
+        if p is None:
+            p = b""
+        if isinstance(p, str):
+            p = p.encode()
+        h.update(len(p).to_bytes(8, "little"))
+        h.update(p)
+    return h.hexdigest()
 
+# Parses terms with up to jobs processes, yielding (year, term, size of section HTML, parsed term)
+# Results are always yielded in the same order as terms, no matter which worker finishes first
+def parseStoredTerms(terms:Iterator[tuple[int, int, str, str, str]], jobs=1, engine="bs4") -> Iterator[tuple[int, int, int, tuple[SemesterRecord, Catalogue, Attributes]]]:
+    from concurrent.futures import ProcessPoolExecutor
+    
+    if jobs <= 1:
+        for term in terms:
+            yield term[0], term[1], len(term[2] or ""), parseStoredTerm(term, engine)
+        return
+    
+    # only keep a few terms in flight so memory stays bounded
+    pending:deque[tuple[int, int, int, Future]] = deque()
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for term in terms:
+            pending.append((term[0], term[1], len(term[2] or ""), executor.submit(parseStoredTerm, term, engine)))
+            del term
+            
+            if len(pending) >= 2 * jobs:
+                year, term, size, future = pending.popleft()
+                yield year, term, size, future.result()
+        
+        while pending:
+            year, term, size, future = pending.popleft()
+            yield year, term, size, future.result()
+
+# Extracts the text of a transfer PDF if it isn't cached already, and parses it
+# Returns (text boxes, transfers)
+def parseStoredPDF(subject, pdf:bytes | None, text:list[str] | None, engine="pdfquery") -> tuple[list[str], list[Transfer]]:
+    from parsers.TransferParser import TransferParser
+    
+    if text is None:
+        text = TransferParser.extractText(pdf, engine)
+    return text, TransferParser.parseTransferText(text, subject)
+
+# Parses (subject, pdf, cached text) with up to jobs processes, yielding (subject, extracted text, transfers, error) in the same order
+# A PDF that fails to parse doesn't stop the others, it is yielded with no transfers and the error instead
+def parseStoredPDFs(pdfs:Iterator[tuple[str, bytes | None, list[str] | None]], jobs=1, engine="pdfquery") -> Iterator[tuple[str, list[str] | None, list[Transfer] | None, str | None]]:
+    from concurrent.futures import ProcessPoolExecutor
+    
+    if jobs <= 1:
+        for subject, pdf, text in pdfs:
+            try:
+                yield subject, *parseStoredPDF(subject, pdf, text, engine), None
+            except Exception as e:
+                yield subject, None, None, f"{type(e).__name__}: {e}"
+        return
+    
+    pending:deque[tuple[str, Future]] = deque()
+    
+    def result(subject, future:Future):
+        try:
+            return subject, *future.result(), None
+        except Exception as e:
+            return subject, None, None, f"{type(e).__name__}: {e}"
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for subject, pdf, text in pdfs:
+            pending.append((subject, executor.submit(parseStoredPDF, subject, pdf, text, engine)))
+            del pdf, text
+            
+            if len(pending) >= 2 * jobs:
+                yield result(*pending.popleft())
+        
+        while pending:
+            yield result(*pending.popleft())
+
+
+# Answers "which sections conflict with these sections?" for every section of a term at once
+# The weekly meeting pattern of a section is a bitset of 5 minute slots x 7 days, each day padded to 5 uint64 words (35 words a week)
+# The term is cut into segments where the set of sessions running changes, and each section has one bitset per segment,
+# so sessions in the first and second half of a term don't conflict with each other
+# Sessions on a single date (e.g. exams) are kept in a separate list instead of cutting the term into more segments
+# Build it once per term and reuse it, a query is one vectorized AND over every section for each word the given sections use
+class ConflictIndex:
+    SLOT_MINUTES = 5
+    SLOTS = 24 * 60 // SLOT_MINUTES
+    DAY_WORDS = (SLOTS + 63) // 64
+    WORDS = 7 * DAY_WORDS
+    
+    def __init__(self, db:Database, year, term):
+        import numpy as np
+        
+        yearterm = year * 100 + term
+        
+        sections = db.connection.execute("SELECT crn, subject, course_code FROM Sections WHERE yearterm=? ORDER BY crn", (yearterm,)).fetchall()
+        self.crns = np.array([c[0] for c in sections], dtype=np.int64)
+        self.subjects = np.array([c[1] for c in sections], dtype=object)
+        self.course_codes = np.array([c[2] for c in sections], dtype=np.int64)
+        self.rows = {crn : i for i, crn in enumerate(self.crns.tolist())}
+        
+        schedules = db.connection.execute("""
+            SELECT crn, day_mask, start_min, end_min, start_date, end_date FROM Schedules
+            WHERE yearterm=? AND day_mask != 0 AND start_min IS NOT NULL""", (yearterm,)).fetchall()
+        
+        # (row, (day_mask, start_min, end_min), span) of sessions that run for more than a day
+        # spans are [first day, day after the last day) as date ordinals, None for sessions without (valid) dates, which run for the whole term
+        weekly = []
+        # (row, date, weekday, start_min, end_min) of sessions on a single date
+        single = []
+        
+        for crn, day_mask, start_min, end_min, start_date, end_date in schedules:
+            if crn not in self.rows:
+                continue
+            
+            span = ConflictIndex._span(start_date, end_date)
+            
+            if span is not None and span[1] - span[0] == 1:
+                weekday = ConflictIndex._weekday(span[0])
+                # a single date that isn't on one of its days never meets
+                if day_mask & (1 << weekday):
+                    single.append((self.rows[crn], span[0], weekday, start_min, end_min))
+                continue
+            
+            weekly.append((self.rows[crn], (day_mask, start_min, end_min), span))
+        
+        # Cut the term at every start / end date, single dates only widen it so that every one of them falls in a segment
+        bounds = {d for _, _, span in weekly if span is not None for d in span}
+        if len(single) > 0:
+            bounds.add(min(s[1] for s in single))
+            bounds.add(max(s[1] for s in single) + 1)
+        bounds = sorted(bounds)
+        
+        # Merge neighbouring pieces that have the same sessions running
+        starting:dict[int, list] = {}
+        ending:dict[int, list] = {}
+        for row, key, span in weekly:
+            if span is not None:
+                starting.setdefault(span[0], []).append((row, key))
+                ending.setdefault(span[1], []).append((row, key))
+        
+        running:dict[tuple, int] = {}
+        segments:list[list[int]] = []
+        # every start / end date : the index of the merged segment it falls in
+        segment:dict[int, int] = {}
+        previous = None
+        for start, end in zip(bounds, bounds[1:]):
+            for session in ending.get(start, []):
+                running[session] -= 1
+                if running[session] == 0:
+                    del running[session]
+            for session in starting.get(start, []):
+                running[session] = running.get(session, 0) + 1
+            
+            active = frozenset(running)
+            if active == previous:
+                segments[-1][1] = end
+            else:
+                segments.append([start, end])
+            previous = active
+            segment[start] = len(segments) - 1
+        
+        # nothing has dates, so the whole term is one segment
+        if len(segments) == 0:
+            segments.append([0, 7])
+        
+        self.segments = len(segments)
+        self.segment_starts = np.array([start for start, end in segments], dtype=np.int64)
+        segment[segments[-1][1]] = len(segments)
+        
+        # days of the week that actually occur in each segment, segments shorter than a week don't have all of them
+        segment_days = []
+        for start, end in segments:
+            mask = 0
+            for day in range(start, min(end, start + 7)):
+                mask |= 1 << ConflictIndex._weekday(day)
+            segment_days.append(ConflictIndex._pattern(mask, 0, 24 * 60))
+        segment_days = np.array(segment_days)
+        
+        # Bits are kept in three parts, each a run of words:
+        #   weekly : every segment's week, weekly sessions of every section against crns' weekly sessions and single dates
+        #   single : the same words, single dates of every section against crns' weekly sessions only
+        #   dates  : a day for each single date, single dates against crns' single dates on that date
+        words = self.segments * ConflictIndex.WORDS
+        dates = sorted({date for _, date, _, _, _ in single})
+        date_index = {date : i for i, date in enumerate(dates)}
+        
+        # (word, row, bits) of every section, tested against the words of a query
+        tested = []
+        # (word, row, bits) a section adds to the words of a query it is in
+        query = []
+        # sessions at the same times in the same segments share their words
+        cached = {}
+        
+        for row, key, span in weekly:
+            if span is None:
+                first, last = 0, self.segments
+            else:
+                first, last = segment[span[0]], segment[span[1]]
+            
+            if (key, first, last) not in cached:
+                bits = (ConflictIndex._pattern(*key) & segment_days[first:last]).reshape(-1)
+                word = np.flatnonzero(bits)
+                cached[key, first, last] = (first * ConflictIndex.WORDS + word, bits[word])
+            word, bits = cached[key, first, last]
+            
+            tested.append((word, row, bits))
+            query.append((word, row, bits))
+            query.append((words + word, row, bits))
+        
+        for row, date, weekday, start_min, end_min in single:
+            if (date, start_min, end_min) not in cached:
+                bits = ConflictIndex._pattern(1 << weekday, start_min, end_min)
+                word = np.flatnonzero(bits)
+                day = 2 * words + date_index[date] * ConflictIndex.DAY_WORDS + word % ConflictIndex.DAY_WORDS
+                cached[date, start_min, end_min] = (self._segmentOf(date) * ConflictIndex.WORDS + word, day, bits[word])
+            word, day, bits = cached[date, start_min, end_min]
+            
+            tested.append((words + word, row, bits))
+            tested.append((day, row, bits))
+            query.append((word, row, bits))
+            query.append((day, row, bits))
+        
+        self.words = 2 * words + len(dates) * ConflictIndex.DAY_WORDS
+        
+        # word-major, so a query is a single pass testing each entry against the word it's in
+        words, rows, bits = ConflictIndex._entries(tested)
+        order = np.argsort(words, kind="stable")
+        self.tested_rows = rows[order]
+        self.tested_bits = bits[order]
+        self.tested_counts = np.bincount(words, minlength=self.words)
+        
+        # row-major, entries of row r are query_offsets[r]:query_offsets[r + 1]
+        words, rows, bits = ConflictIndex._entries(query)
+        order = np.argsort(rows, kind="stable")
+        self.query_words = words[order]
+        self.query_bits = bits[order]
+        self.query_offsets = np.searchsorted(rows[order], np.arange(len(sections) + 1))
+    
+    # (words, rows, bits) arrays of a list of (words, row, bits)
+    def _entries(entries):
+        import numpy as np
+        
+        if len(entries) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+        
+        words = np.concatenate([e[0] for e in entries])
+        rows = np.repeat(np.array([e[1] for e in entries], dtype=np.int64), [len(e[0]) for e in entries])
+        bits = np.concatenate([e[2] for e in entries])
+        return words, rows, bits
+    
+    # (first day, day after the last day) as date ordinals, or None if the dates aren't ISO dates
+    def _span(start:str | None, end:str | None) -> tuple[int, int] | None:
+        try:
+            start = datetime.fromisoformat(start).toordinal()
+            end = datetime.fromisoformat(end).toordinal() + 1
+        except (TypeError, ValueError):
+            return None
+        
+        if end <= start:
+            return None
+        return start, end
+    
+    # 0 for Monday, like the bits of a day mask
+    def _weekday(ordinal) -> int:
+        # date.toordinal() is 1 on a Monday
+        return (ordinal - 1) % 7
+    
+    def _segmentOf(self, ordinal) -> int:
+        import numpy as np
+        
+        return max(int(np.searchsorted(self.segment_starts, ordinal, side="right")) - 1, 0)
+    
+    # Bitset of the slots a session meets in every week, day d is words d * DAY_WORDS to (d + 1) * DAY_WORDS
+    # A session ending at 1220 doesn't conflict with one starting at 1220
+    def _pattern(day_mask, start_min, end_min):
+        import numpy as np
+        
+        slots = np.zeros((7, ConflictIndex.DAY_WORDS * 64), dtype=bool)
+        first = start_min // ConflictIndex.SLOT_MINUTES
+        last = -(-end_min // ConflictIndex.SLOT_MINUTES)
+        
+        for day in range(7):
+            if day_mask & (1 << day):
+                slots[day, first:last] = True
+        
+        return np.packbits(slots, axis=1).view(np.uint64).reshape(-1)
+    
+    # Boolean array over self.crns, True for every section that meets at the same time as any of crns
+    # Sections in crns conflict with themselves, unknown CRNs and sections without times are ignored
+    def conflicts(self, crns:list[int]):
+        import numpy as np
+        
+        hits = np.zeros(len(self.crns), dtype=bool)
+        
+        rows = [self.rows[crn] for crn in crns if crn in self.rows]
+        if len(rows) == 0:
+            return hits
+        
+        # a query's words can be set by several of its sections, so they're OR'd in with .at
+        mask = np.zeros(self.words, dtype=np.uint64)
+        for row in rows:
+            first, last = self.query_offsets[row], self.query_offsets[row + 1]
+            np.bitwise_or.at(mask, self.query_words[first:last], self.query_bits[first:last])
+        
+        clash = (self.tested_bits & np.repeat(mask, self.tested_counts)) != 0
+        hits[self.tested_rows[clash]] = True
+        
+        return hits
+    
+    # CRNs that conflict with any of crns
+    def conflictingCRNs(self, crns:list[int]) -> list[int]:
+        return self.crns[self.conflicts(crns)].tolist()
+    
+    # CRNs of sections that don't conflict with any of crns, optionally only sections of one course
+    # e.g. compatibleCRNs([10001, 10002], "CPSC", 1050) : which sections of CPSC 1050 fit around my timetable?
+    def compatibleCRNs(self, crns:list[int], subject=None, course_code=None) -> list[int]:
+        keep = ~self.conflicts(crns)
+        
+        if subject is not None:
+            keep &= self.subjects == subject
+        if course_code is not None:
+            keep &= self.course_codes == int(course_code)
+        
+        return self.crns[keep].tolist()
 
 
 class Utilities():
@@ -242,17 +1278,27 @@ class Utilities():
         
     # Build Database from scratch, fetching new files from all data sources
     # WARNING: THIS TAKES ~ ONE HOUR TO RUN 
-    def buildDatabase(self):
+    # Terms already stored that ended more than horizon terms ago are not downloaded again, unless fetch_all is set
+    def buildDatabase(self, fetch_all=False, horizon=3):
+        from scrapers.DownloadLangaraInfo import DownloadAllTermsFromWeb, frozenTerms
+        from scrapers.DownloadTransferInfo import TransferScraper
+        
         start = time.time()
         
-        # Download / Save Transfer Information
+        # Download Transfer Information
         s = TransferScraper(headless=True)
         s.downloadAllSubjects(start_at=0)
+        
+        # Source files are committed as they are stored, one PDF / term at a time, so a failure later in the build
+        # doesn't lose them. The downloaded PDFs are only deleted once all of them are in the database.
         TransferScraper.sendPDFToDatabase(self.db, delete=True)
         
         # Download / Save Langara HTML
-        DownloadAllTermsFromWeb(self.db.insertLangaraHTML)
-
+        skip = set()
+        if not fetch_all:
+            skip = frozenTerms(self.db.getStoredTerms(), horizon)
+        DownloadAllTermsFromWeb(self.db.insertLangaraHTML, skip=skip, keep_results=False)
+        
         # Begin parsing saved files
         self.rebuildDatabaseFromStored()
         
@@ -265,35 +1311,296 @@ class Utilities():
     # Rebuild data by parsing stored HTML and PDF
     # Mostly used for debugging
     # WARNING: TAKES ~ TEN MINUTES
-    def rebuildDatabaseFromStored(self):
-        # Clear old data and recreate tables
-        self.db.cursor.executescript("DROP TABLE Sections; DROP TABLE Schedules; DROP TABLE CourseInfo; DROP TABLE TransferInformation")
-        self.db.connection.commit()
-        self.db.createTables()
+    # jobs > 1 parses terms and transfer PDFs in that many processes, everything is still written from this process
+    # engine selects the section parser (see parseSemesterHTML), pdf_engine selects the transfer parser (see TransferParser.parseTransferPDF)
+    # pdf_engine="pymupdf" is opt-in until compareTransferParsers agrees on every stored PDF
+    # incremental only reparses sources that changed, or whose parser version changed, since they were last parsed
+    def rebuildDatabaseFromStored(self, jobs=1, engine="bs4", incremental=False, pdf_engine="pdfquery"):
+        # the sections and catalogue are written in one transaction
+        with self.db.bulkLoad():
+            if not incremental:
+                # Clear old data and recreate tables
+                self.db.dropDerivedTables()
+                self.db.clearParseLog()
+                self.db.createTables()
+            
+            self._rebuildSemesters(jobs, engine)
+        
+        # transfers are committed one subject at a time, so an interrupted rebuild keeps every subject parsed so far
+        self._rebuildTransfers(jobs, pdf_engine)
+    
+    def _rebuildSemesters(self, jobs, engine):
+        from parsers.AttributesParser import AttributesParser
+        from parsers.CatalogueParser import CatalogueParser
+        from parsers.SemesterParser import PARSER_VERSION as SEMESTER_PARSER_VERSION
+        
+        section_version = str(SEMESTER_PARSER_VERSION)
+        catalogue_version = f"{CatalogueParser.PARSER_VERSION}.{AttributesParser.PARSER_VERSION}"
+        
+        section_log = self.db.getParseLog("sections")
+        catalogue_log = self.db.getParseLog("catalogue")
+        
+        # The stored hashes tell what needs to be parsed again, without reading any HTML
+        hashes = self.db.getLangaraHTMLHashes()
         
-        # TODO: Fetching 200 mb of HTML files at once seems questionable
-        html = self.db.getAllLangaraHTML()
+        stale_sections = set()
+        for (year, term), (section_hash, catalogue_hash) in hashes.items():
+            if section_log.get(f"{year}{term}") != (section_hash, section_version):
+                stale_sections.add((year, term))
+        
+        # CourseInfo is merged across every term, so it is rebuilt completely if any catalogue changed
+        rebuild_catalogue = len(catalogue_log) != len(hashes)
+        for (year, term), (section_hash, catalogue_hash) in hashes.items():
+            if catalogue_log.get(f"{year}{term}") != (catalogue_hash, catalogue_version):
+                rebuild_catalogue = True
+        
+        # Terms whose HTML was removed from the database
+        for key in section_log:
+            if (int(key[:4]), int(key[4:])) not in hashes:
+                self.db.deleteSemester(int(key[:4]), int(key[4:]))
+                self.db.clearParseLog("sections", key)
+        
+        print(f"{len(stale_sections)} of {len(hashes)} terms need their sections parsed.")
+        if rebuild_catalogue:
+            print("Catalogue and attributes need to be parsed.")
+        
+        # only hand the parser the HTML that actually needs parsing
+        def pending():
+            for term in self.db.iterLangaraHTML([t for t in hashes if t in stale_sections or rebuild_catalogue]):
+                sections = term[2] if (term[0], term[1]) in stale_sections else None
+                
+                if rebuild_catalogue:
+                    yield (term[0], term[1], sections, term[3], term[4])
+                else:
+                    yield (term[0], term[1], sections, None, None)
         
         catalogue = Catalogue()
         attributes = Attributes()
+    
+        # Stream terms one at a time so peak memory doesn't grow with the amount of history stored
+        # Terms arrive newest to oldest, so the first catalogue / attribute entry seen for a course wins
+        for year, term, size, parsed in parseStoredTerms(pending(), jobs, engine):
+            print(f"Parsing HTML for {year}{term} ({size}).")
         
-        for term in html:
-            print(f"Parsing HTML for {term[0]}{term[1]} ({len(term[2])}).")
+            semester, c, a = parsed
             
-            self.db.insertSemester(parseSemesterHTML(term[2]))
-            CatalogueParser.parseCatalogue(term[3], catalogue)
-            AttributesParser.parseHTML(term[4], attributes)
+            if semester is not None:
+                self.db.replaceSemester(semester)
+                self.db.setParseLog("sections", f"{year}{term}", hashes[(year, term)][0], section_version)
+            
+            if c is not None:
+                for course in c.courses:
+                    catalogue.addCourseSkipDuplicates(course)
+            if a is not None:
+                for attribute in a.attributes:
+                    attributes.addAttribSkipDuplicates(attribute)
+        
+            # release this term's parsed data before the next one is fetched
+            del parsed, semester, c, a
+        
+        if rebuild_catalogue:
+            #print(catalogue)
+            #print(attributes)
+            self.db.cursor.execute("DELETE FROM CourseInfo")
+            self.db.insertCatalogueAttributes(catalogue, attributes)
+            
+            self.db.clearParseLog("catalogue")
+            for (year, term), (section_hash, catalogue_hash) in hashes.items():
+                self.db.setParseLog("catalogue", f"{year}{term}", catalogue_hash, catalogue_version)
+    
+    def _rebuildTransfers(self, jobs, pdf_engine):
+        from parsers.TransferParser import TransferParser
+        
+        version = str(TransferParser.PARSER_VERSION)
+        log = self.db.getParseLog("transfer")
+        
+        hashes = self.db.getTransferPDFHashes()
+        
+        stale = [subject for subject in hashes if log.get(subject) != (hashes[subject], version)]
+        
+        # Subjects whose PDF was removed from the database
+        for subject in log:
+            if subject not in hashes:
+                self.db.deleteTransfers(subject)
+                self.db.deleteTransferText(subject)
+                self.db.clearParseLog("transfer", subject)
+        
+        print(f"{len(stale)} of {len(hashes)} transfer PDFs need to be parsed.")
+        if len(stale) == 0:
+            return
+        
+        extracted = set()
+        
+        # Use the cached text when there is some, otherwise the PDF is read straight from the database
+        def pending():
+            for subject in stale:
+                text = self.db.getTransferText(subject, pdf_engine, hashes[subject])
+                
+                if text is not None:
+                    yield subject, None, text
+                    continue
+                
+                extracted.add(subject)
+                for subject, pdf in self.db.iterTransferPDF([subject]):
+                    yield subject, pdf, None
+        
+        failed:dict[str, str] = {}
+        
+        # each subject is saved as soon as it is parsed
+        for subject, text, transfers, error in parseStoredPDFs(pending(), jobs, pdf_engine):
+            if error is not None:
+                # keep whatever was parsed last time, and try again on the next rebuild
+                failed[subject] = error
+                continue
+            
+            if subject in extracted:
+                self.db.insertTransferText(subject, pdf_engine, hashes[subject], text, *TransferParser.headerCounts(text))
+            
+            self.db.replaceTransfers(subject, transfers)
+            self.db.setParseLog("transfer", subject, hashes[subject], version)
+        
+        if len(failed) > 0:
+            print(f"Could not parse transfer PDFs for {len(failed)} of {len(stale)} subjects:")
+            for subject, error in failed.items():
+                print(f"  {subject} : {error}")
+    
+    # Runs both section parser engines over every stored term and reports any term where they disagree
+    # Returns the terms that did not match
+    def compareSemesterParsers(self) -> list[tuple[int, int]]:
+        from parsers.SemesterParser import parseSemesterHTML
+        
+        mismatches:list[tuple[int, int]] = []
+        
+        for term in self.db.iterLangaraHTML():
+            expected = parseSemesterHTML(term[2], "bs4")
+            actual = parseSemesterHTML(term[2], "lxml")
+            
+            # datetime_retrieved is just when the object was made
+            expected = expected.model_dump(exclude={"datetime_retrieved"})
+            actual = actual.model_dump(exclude={"datetime_retrieved"})
+            
+            if expected == actual:
+                continue
+            
+            mismatches.append((term[0], term[1]))
+            
+            if len(expected["courses"]) != len(actual["courses"]):
+                print(f"{term[0]}{term[1]} : bs4 found {len(expected['courses'])} sections but lxml found {len(actual['courses'])}.")
+                continue
+            
+            for e, a in zip(expected["courses"], actual["courses"]):
+                if e != a:
+                    print(f"{term[0]}{term[1]} : CRN {e['crn']} differs.\n  bs4:  {e}\n  lxml: {a}")
+                    break
+        
+        print(f"Semester parsers disagree on {len(mismatches)} terms.")
+        return mismatches
+    
+    # Runs both transfer PDF engines over every stored PDF and reports any subject where they disagree
+    # Returns the subjects that did not match
+    def compareTransferParsers(self) -> list[str]:
+        mismatches:list[str] = []
+        
+        for subject, pdf in self.db.iterTransferPDF():
+            difference = Utilities.compareTransferPDF(subject, pdf)
+            
+            if difference is not None:
+                print(difference)
+                mismatches.append(subject)
+        
+        print(f"Transfer parsers disagree on {len(mismatches)} subjects.")
+        return mismatches
+    
+    # Parses one PDF with both engines, returns None if they agree or a description of the first difference
+    # The same text always parses to the same transfers, so the text is compared first
+    def compareTransferPDF(subject, pdf:bytes) -> str | None:
+        from parsers.TransferParser import TransferParser
+        
+        expected_text = TransferParser.extractText(pdf, "pdfquery")
+        actual_text = TransferParser.extractText(pdf, "pymupdf")
+        
+        if expected_text == actual_text:
+            return None
+        
+        try:
+            expected = [t.model_dump() for t in TransferParser.parseTransferText(expected_text, subject)]
+            actual = [t.model_dump() for t in TransferParser.parseTransferText(actual_text, subject)]
+        except Exception as e:
+            i = next((i for i, (x, y) in enumerate(zip(expected_text, actual_text)) if x != y), min(len(expected_text), len(actual_text)))
+            x = expected_text[i] if i < len(expected_text) else None
+            y = actual_text[i] if i < len(actual_text) else None
+            return f"{subject} : could not be parsed ({type(e).__name__}: {e}), text differs at line {i}.\n  pdfquery: {x!r}\n  pymupdf:  {y!r}"
+        
+        if expected == actual:
+            return None
+        
+        if len(expected) != len(actual):
+            return f"{subject} : pdfquery found {len(expected)} transfers but pymupdf found {len(actual)}."
+        
+        for e, a in zip(expected, actual):
+            if e != a:
+                return f"{subject} : transfers differ.\n  pdfquery: {e}\n  pymupdf:  {a}"
+    
+    # Times building and serializing the sections of a term one model at a time against whole lists at once
+    # Defaults to the latest term in the database, returns the fastest time (in seconds) of each method
+    def benchmarkValidation(self, year=None, term=None, repeat=5) -> dict[str, float]:
+        if year is None or term is None:
+            year, term = self.db.cursor.execute("SELECT year, term FROM Sections ORDER BY yearterm DESC").fetchone()
+        
+        courses = list(self.db.getSections(year, term).values())
+        data = [c.model_dump() for c in courses]
+        
+        methods = {
+            "load from database (construct)" : lambda: self.db.getSections(year, term),
+            "validate one at a time" : lambda: [Course(**d) for d in data],
+            "validate list (TypeAdapter)" : lambda: CourseList.validate_python(data),
+            "serialize one at a time" : lambda: [c.model_dump_json() for c in courses],
+            "serialize list (TypeAdapter)" : lambda: CourseList.dump_json(courses),
+        }
+        
+        results:dict[str, float] = {}
+        for name, method in methods.items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                method()
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            results[name] = best
+        
+        print(f"{len(courses)} sections in {year}{term}:")
+        for name, elapsed in results.items():
+            print(f"  {name:<32} {elapsed * 1000:8.2f} ms")
+        
+        return results
+    
+    # Times building a ConflictIndex for a term, and the conflicts of every section in it against the rest of the term
+    def benchmarkConflicts(self, year=None, term=None, repeat=5) -> dict[str, float]:
+        if year is None or term is None:
+            year, term = self.db.cursor.execute("SELECT year, term FROM Sections ORDER BY yearterm DESC").fetchone()
+        
+        start = time.perf_counter()
+        index = ConflictIndex(self.db, year, term)
+        build = time.perf_counter() - start
+        
+        crns = index.crns.tolist()
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for crn in crns:
+                index.conflicts([crn])
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        
+        query = best / max(len(crns), 1)
         
-        #print(catalogue)
-        #print(attributes)
-        self.db.insertCatalogueAttributes(catalogue, attributes)
+        print(f"{len(crns)} sections in {year}{term}, {index.segments} date segments:")
+        print(f"  {'build index':<32} {build * 1000:8.2f} ms")
+        print(f"  {'conflicts of one section':<32} {query * 1000000:8.2f} us")
         
-        # Restore PDF files from database
-        TransferScraper.retrieveAllPDFFromDatabase(self.db)
-        transfers = TransferParser.parseTransferPDFs()
-        self.db.insertTransfers(transfers)
-        # Delete PDF files from filesystem
-        #TransferScraper.sendPDFToDatabase()
+        return {"build" : build, "query" : query}
     
     def exportDatabase(self, filename_override=None, delete_prev=True):
         t = datetime.today()
@@ -308,20 +1615,45 @@ class Utilities():
             except OSError:
                 pass
 
+        # Schema of everything that gets exported, source files and build bookkeeping are left out
+        schema = self.db.cursor.execute("SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL").fetchall()
+        schema = [s for s in schema if s[2] not in Database.source_tables]
+        
+        tables = [(name, sql) for type, name, table, sql in schema if type == "table"]
+        others = [sql for type, name, table, sql in schema if type != "table"]
+        
         new_db = sqlite3.connect(fn)
-        # copies all tables
-        query = "".join(line for line in self.db.connection.iterdump())
-        new_db.executescript(query)
-        # TODO: don't copy 200mb of data just to delete it half a second later
-        new_db.executescript("DROP TABLE SemesterHTML; DROP TABLE TransferPDF; VACUUM")
+        for name, sql in tables:
+            new_db.execute(sql)
+        new_db.execute(f"PRAGMA user_version = {Database.SCHEMA_VERSION}")
         new_db.commit()
-            
-            
+        new_db.close()
+        
+        # Copy rows straight from one file to the other inside SQLite
+        self.db.connection.commit()
+        self.db.cursor.execute("ATTACH DATABASE ? AS export", (fn,))
+        try:
+            for name, sql in tables:
+                # generated columns can't be inserted into
+                columns = [c[1] for c in self.db.cursor.execute(f'PRAGMA main.table_xinfo("{name}")').fetchall() if c[6] == 0]
+                columns = ", ".join(f'"{c}"' for c in columns)
+                self.db.cursor.execute(f'INSERT INTO export."{name}" ({columns}) SELECT {columns} FROM main."{name}"')
+            self.db.connection.commit()
+        finally:
+            self.db.cursor.execute("DETACH DATABASE export")
+        
+        # Indexes and views are created after the data is in, which is faster than updating them row by row
+        new_db = sqlite3.connect(fn)
+        for sql in others:
+            new_db.execute(sql)
+        new_db.commit()
+        new_db.close()
         
+
     def countSections(self, year=None, term=None):
         if year != None and term != None:
-            query = "SELECT COUNT(*) FROM Sections WHERE year=? AND term=?"
-            self.db.cursor.execute(query, (year, term))
+            query = "SELECT COUNT(*) FROM Sections WHERE yearterm=?"
+            self.db.cursor.execute(query, (year * 100 + term,))
         elif year != None:  
             query = "SELECT COUNT(*) FROM Sections WHERE year=?"
             self.db.cursor.execute(query, (year,))
@@ -354,43 +1686,65 @@ class Utilities():
         n = self.db.cursor.execute("SELECT COUNT(*) FROM TransferInformation").fetchone()
         print(f"{n[0]} unique transfer agreements found.")
     
-    def updateCurrentSemester(self) -> list[tuple[Course|None, Course]]:
+    # Compares a freshly parsed semester against the one stored in the database
+    # Returns (stored, new) pairs:
+    # (None, new) for new sections, (stored, new) for changed sections and (stored, None) for removed sections
+    # subjects limits the comparison to sections of those subjects, for when semester only has some subjects in it
+    def diffSemester(self, semester:Semester, subjects:list[str] = None) -> list[tuple[Course|None, Course|None]]:
         
-        # Get Last semester.
-        yt = self.db.cursor.execute("SELECT year, term FROM Sections ORDER BY year DESC, term DESC").fetchone()
-                
-        term = fetchTermFromWeb(yt[0], yt[1])
-                    
-        print(f"Parsing HTML for {term[0]}{term[1]} ({len(term[2])}).")
-        semester = parseSemesterHTML(term[2])
+        # Load the whole stored term at once instead of querying section by section.
+        stored = self.db.getSections(semester.year, semester.term)
         
-        # Look for any changes to a course or schedule.
-        changes:list[tuple[Course|None, Course]] = []
+        if subjects is not None:
+            stored = {crn : c for crn, c in stored.items() if c.subject in subjects}
+        
+        changes:list[tuple[Course|None, Course|None]] = []
         
         for c in semester.courses:
             
-            # Check if a section with all the same attributes exists in the database.
-            db_course:Course = self.db.getSection(semester.year, semester.term, c.crn)
-
+            db_course = stored.pop(c.crn, None)
+            
             if db_course == None:
                 # This section has not been seen before in the database.
                 changes.append((None, c))
-                continue
             
             elif not c.isEqual(db_course):
-                # This section has different information than in the database.
+                # This section or its schedule has different information than in the database.
                 changes.append((db_course, c))
-                continue
-            
-            # Look for schedule changes.
-            for s in c.schedule:
-                
-                if not s.isIn(db_course.schedule):
-                    # The schedule for this section is different than in the database.
-                    changes.append((db_course, c))
-                    break
+        
+        # Anything left was in the database but is no longer in the SIS.
+        for crn in sorted(stored):
+            changes.append((stored[crn], None))
+        
+        return changes
+    
+    # shard_size downloads sections in parallel batches of that many subjects
+    # subjects only refreshes the sections of those subjects, the stored HTML and catalogue are left alone
+    def updateCurrentSemester(self, subjects:list[str] = None, shard_size:int = None) -> list[tuple[Course|None, Course|None]]:
+        from parsers.AttributesParser import AttributesParser
+        from parsers.CatalogueParser import CatalogueParser
+        from parsers.SemesterParser import parseSemesterHTML
+        from scrapers.DownloadLangaraInfo import fetchTermFromWeb
+        
+        
+        # Get Last semester.
+        yt = self.db.cursor.execute("SELECT year, term FROM Sections ORDER BY yearterm DESC").fetchone()
+        
+        if subjects is not None:
+            return self._updateSubjects(yt[0], yt[1], subjects, shard_size or 10)
                 
-        self.db.insertSemester(semester)
+        term = fetchTermFromWeb(yt[0], yt[1], shard_size=shard_size)
+                    
+        print(f"Parsing HTML for {term[0]}{term[1]} ({len(term[2])}).")
+        semester = parseSemesterHTML(term[2])
+        
+        # Look for any changes to a course or schedule.
+        changes = self.diffSemester(semester)
+        
+        # the whole term was fetched, so sections that aren't in it anymore are deleted
+        inserted, updated, unchanged = self.db.replaceSemester(semester)
+        removed = sum(1 for old, new in changes if new is None)
+        print(f"{term[0]}{term[1]} : {inserted} sections added, {updated} updated, {removed} removed and {unchanged} unchanged.")
         self.db.insertLangaraHTML(term[0], term[1], term[2], term[3], term[4])
         
         c = CatalogueParser.parseCatalogue(term[3])
@@ -398,4 +1752,22 @@ class Utilities():
         self.db.insertCatalogueAttributes(c, a)
         
         return changes
-                
\ No newline at end of file
+    
+    def _updateSubjects(self, year, term, subjects:list[str], shard_size) -> list[tuple[Course|None, Course|None]]:
+        from parsers.SemesterParser import parseSemesterShards
+        from scrapers.DownloadLangaraInfo import fetchSectionShardsFromWeb
+        
+        pages = fetchSectionShardsFromWeb(year, term, subjects, shard_size)
+        
+        print(f"Parsing HTML for {year}{term} ({len(subjects)} subjects).")
+        semester = parseSemesterShards(pages)
+        
+        # Look for any changes to a course or schedule.
+        changes = self.diffSemester(semester, subjects)
+        
+        # only sections of the fetched subjects can have been removed
+        inserted, updated, unchanged = self.db.replaceSubjects(semester, subjects)
+        removed = sum(1 for old, new in changes if new is None)
+        print(f"{year}{term} : {inserted} sections added, {updated} updated, {removed} removed and {unchanged} unchanged.")
+        
+        return changes
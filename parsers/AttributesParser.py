@@ -12,6 +12,9 @@ s = AttributesParser()
 s.LoadParseAndSave()
 '''
 class AttributesParser:
+    
+    # Bump this whenever a change to the parser changes what it outputs
+    PARSER_VERSION = 1
 
     def parseHTML(html, attributes:Attributes = Attributes()) -> Attributes:
         
@@ -34,10 +37,16 @@ class AttributesParser:
         i = 0
         while i < len(table_items):
             
+            subject, course_code = table_items[i].split(" ")[0:2]
+            
+            # don't bother building attributes for courses that are already known
+            if attributes.hasAttrib(subject, course_code):
+                i += 8
+                continue
             
             a = Attribute(
-                subject = table_items[i].split(" ")[0],
-                course_code = table_items[i].split(" ")[1],
+                subject = subject,
+                course_code = course_code,
                 attributes = {
                     "AR" : table_items[i+1],
                     "SC": table_items[i+2],
@@ -9,6 +9,9 @@ Parses the Langara Course Catalogue into json.
 '''
 class CatalogueParser:
     
+    # Bump this whenever a change to the parser changes what it outputs
+    PARSER_VERSION = 1
+    
     def parseCatalogue(html, catalogue:Catalogue = Catalogue()) -> Catalogue:
         #return CatalogueParser.__parseCatalogue(html, catalogue)
     
@@ -27,7 +30,13 @@ class CatalogueParser:
         
         
         for div in coursedivs:
-            h2 = div.findChild("h2").text
+            h2 = div.findChild("h2").text.split()
+            # h2 = ['ABST', '1100', '(3', 'credits)', '(3:0:0)']
+            
+            # don't bother building courses that are already in the catalogue
+            if catalogue.hasCourse(h2[0], h2[1]):
+                continue
+            
             title = div.findChild("b").text
             
             # the best way i can find to find an element with no tag            
@@ -36,8 +45,6 @@ class CatalogueParser:
                     description = e.text.strip()
                     break
             
-            h2 = h2.split()
-            # h2 = ['ABST', '1100', '(3', 'credits)', '(3:0:0)']
             hours = h2[4].replace("(", "").replace(")", "").split(":")
             hours = {
                 "lecture" : float(hours[0]),
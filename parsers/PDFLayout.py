@@ -0,0 +1,513 @@
+import heapq
+import re
+
+import fitz
+from lxml import etree
+
+# A char, text line, text box, group of text boxes or drawing in pdfminer's layout analysis
+# Coordinates are pdfminer's: y goes up from the bottom left of the mediabox
+class LayoutItem:
+    
+    def __init__(self, tag, text=None, vertical=False, group=False):
+        self.x0 = self.y0 = float("inf")
+        self.x1 = self.y1 = float("-inf")
+        self.tag = tag
+        self.text = text
+        self.vertical = vertical
+        self.group = group
+        self.items:list[LayoutItem] = []
+    
+    @property
+    def width(self):
+        return self.x1 - self.x0
+    
+    @property
+    def height(self):
+        return self.y1 - self.y0
+    
+    def add(self, item:"LayoutItem"):
+        self.items.append(item)
+        self.addPoint(item.x0, item.y0)
+        self.addPoint(item.x1, item.y1)
+    
+    def addPoint(self, x, y):
+        self.x0 = min(self.x0, x)
+        self.y0 = min(self.y0, y)
+        self.x1 = max(self.x1, x)
+        self.y1 = max(self.y1, y)
+    
+    def overlaps(self, x0, y0, x1, y1) -> bool:
+        return not (self.x1 <= x0 or x1 <= self.x0 or self.y1 <= y0 or y1 <= self.y0)
+    
+    def isEmpty(self) -> bool:
+        return self.width <= 0 or self.height <= 0 or self.text.isspace()
+
+
+# Reads the text of a pdf page the way pdfquery does, from the chars and drawings PyMuPDF reads
+#
+# pdfquery runs pdfminer's layout analysis (chars -> lines -> boxes -> a tree of box groups that orders the boxes),
+# then builds an xml tree out of the layout where every element is moved inside the first element its bbox fits in.
+# TransferParser.extractTextPdfquery reads the text of the LTTextBoxHorizontal elements of that tree, so both steps
+# are done here the same way, using pdfquery's defaults (LAParams(all_texts=True, detect_vertical=True)).
+#
+# Not covered: text inside form xobjects, which pdfminer analyzes separately inside an LTFigure.
+class PDFLayout:
+    
+    # pdfminer's LAParams defaults
+    LINE_OVERLAP = 0.5
+    CHAR_MARGIN = 2.0
+    LINE_MARGIN = 0.5
+    WORD_MARGIN = 0.1
+    BOXES_FLOW = 0.5
+    
+    # The descent pdfminer uses for the standard fonts, from their AFM metrics (pdfminer.fontmetrics)
+    STANDARD_DESCENTS = {
+        **dict.fromkeys(["Courier", "Courier-Bold", "Courier-BoldOblique", "Courier-Oblique",
+                         "CourierNew", "CourierNew,Italic", "CourierNew,Bold", "CourierNew,BoldItalic"], -0.194),
+        **dict.fromkeys(["Helvetica", "Helvetica-Bold", "Helvetica-BoldOblique", "Helvetica-Oblique",
+                         "Arial", "Arial,Italic", "Arial,Bold", "Arial,BoldItalic"], -0.207),
+        **dict.fromkeys(["Times-Roman", "Times-Bold", "Times-BoldItalic", "Times-Italic",
+                         "TimesNewRoman", "TimesNewRoman,Italic", "TimesNewRoman,Bold", "TimesNewRoman,BoldItalic"], -0.217),
+        "Symbol": 0,
+        "ZapfDingbats": 0,
+    }
+    
+    # same as pdfquery.strip_invalid_xml_chars
+    INVALID_XML_CHARS = re.compile(u'[^\u0020-\uD7FF\u0009\u000A\u000D\uE000-\uFFFD\u10000-\u10FFFF]+')
+    
+    # no clipping to the mediabox and no spaces made up by MuPDF, pdfminer does neither
+    TEXT_FLAGS = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_INHIBIT_SPACES
+    
+    # Returns the text of every line of every LTTextBoxHorizontal on the page, in the order pdfquery lists them
+    def pageText(doc, page) -> list[str]:
+        point = PDFLayout.pdfminerPoint(page)
+        
+        chars = PDFLayout.pageChars(doc, page, point)
+        lines = PDFLayout.groupChars(chars) if chars else []
+        
+        # LTLayoutContainer.analyze
+        empties = [line for line in lines if line.isEmpty()]
+        lines = [line for line in lines if not line.isEmpty()]
+        boxes = PDFLayout.groupLines(lines)
+        
+        order:list[LayoutItem] = []
+        if boxes:
+            PDFLayout.walk(PDFLayout.groupBoxes(boxes), order)
+        
+        items = order + PDFLayout.pageDrawings(page, point) + empties
+        
+        return PDFLayout.treeText(items, PDFLayout.pageAnnots(doc, page))
+    
+    # Returns a function that maps PyMuPDF's page coordinates (y goes down from the top left of the cropbox)
+    # to pdfminer's (y goes up from the bottom left of the mediabox, turned like the page is rotated)
+    def pdfminerPoint(page):
+        mx0, my0, mx1, my1 = page.mediabox
+        cx, cy = page.cropbox.x0, my1 - page.cropbox.y0
+        rotation = page.rotation % 360
+        
+        def point(x, y):
+            x, y = cx + x, cy - y
+            
+            if rotation == 90:
+                return y - my0, mx1 - x
+            elif rotation == 180:
+                return mx1 - x, my1 - y
+            elif rotation == 270:
+                return my1 - y, x - mx0
+            else:
+                return x - mx0, y - my0
+        
+        return point
+    
+    # Returns the descent of each font on a page as a fraction of the font size, read the way pdfminer reads it:
+    # the AFM metrics for the standard fonts, the font descriptor for everything else
+    # PyMuPDF's span["descender"] comes from the font file it renders with, which is often a substitute
+    def fontDescents(doc, page) -> dict[str, float]:
+        descents:dict[str, float] = {}
+        
+        for xref, ext, kind, basefont, *_ in page.get_fonts():
+            if basefont in PDFLayout.STANDARD_DESCENTS:
+                descent = PDFLayout.STANDARD_DESCENTS[basefont]
+            
+            elif kind == "Type3":
+                bbox = doc.xref_get_key(xref, "FontBBox")[1].strip("[] ").split()
+                matrix = doc.xref_get_key(xref, "FontMatrix")[1].strip("[] ").split()
+                descent = float(bbox[1]) * (float(matrix[1]) + float(matrix[3])) if len(bbox) == 4 and len(matrix) == 6 else 0
+            
+            else:
+                # CID fonts keep their descriptor in the descendant font
+                if kind == "Type0":
+                    descendant = doc.xref_get_key(xref, "DescendantFonts")[1].strip("[] ").split()
+                    if len(descendant) == 3 and descendant[2] == "R":
+                        xref = int(descendant[0])
+                
+                kind, value = doc.xref_get_key(xref, "FontDescriptor/Descent")
+                # pdfminer forces the descent to be negative
+                descent = -abs(float(value)) / 1000 if kind in ("int", "float") else 0
+            
+            # PyMuPDF names spans without the subset prefix (ABCDEF+)
+            descents[basefont.split("+")[-1]] = descent
+        
+        return descents
+    
+    # Returns the chars of the page in the order they are drawn (LTChar)
+    # pdfminer makes a char as high as its font size, starting at the descent below the baseline,
+    # PyMuPDF's char boxes use the ascender instead, so only the origin and advance are taken from them
+    def pageChars(doc, page, point) -> list[LayoutItem]:
+        descents = PDFLayout.fontDescents(doc, page)
+        chars:list[LayoutItem] = []
+        
+        for block in page.get_text("rawdict", flags=PDFLayout.TEXT_FLAGS, clip=fitz.INFINITE_RECT())["blocks"]:
+            # skip images
+            if block["type"] != 0:
+                continue
+            
+            for line in block["lines"]:
+                dx, dy = line["dir"]
+                
+                for span in line["spans"]:
+                    size = span["size"]
+                    descent = descents.get(span["font"], span["descender"]) * size
+                    
+                    for c in span["chars"]:
+                        x0, y0, x1, y1 = c["bbox"]
+                        ox, oy = c["origin"]
+                        advance = abs((x1 - x0) * dx) + abs((y1 - y0) * dy)
+                        
+                        char = LayoutItem("LTChar", c["c"])
+                        for t in (0, advance):
+                            for s in (descent, descent + size):
+                                # up is (dy, -dx) when y goes down
+                                char.addPoint(*point(ox + dx * t + dy * s, oy + dy * t - dx * s))
+                        
+                        chars.append(char)
+        
+        return chars
+    
+    # Returns the rects, lines and curves (one per subpath) and images of the page in the order they are drawn
+    # Only their bboxes matter, so they are all the same kind of item
+    def pageDrawings(page, point) -> list[LayoutItem]:
+        paths = {path["seqno"]: path for path in page.get_drawings()}
+        drawings:list[LayoutItem] = []
+        
+        for seqno, (kind, rect) in enumerate(page.get_bboxlog()):
+            if kind in ("fill-image", "fill-imgmask"):
+                # pdfminer puts every image in an LTFigure of the same size
+                figure = LayoutItem("LTFigure")
+                image = LayoutItem("LTImage")
+                image.addPoint(*point(rect[0], rect[1]))
+                image.addPoint(*point(rect[2], rect[3]))
+                figure.add(image)
+                drawings.append(figure)
+            
+            elif seqno in paths:
+                end = None
+                
+                for item in paths[seqno]["items"]:
+                    # pdfminer only uses the end points of a curve, not its control points
+                    if item[0] == "re":
+                        points = [item[1].tl, item[1].br]
+                    elif item[0] == "qu":
+                        points = [item[1].ul, item[1].ur, item[1].ll, item[1].lr]
+                    else:
+                        points = [item[1], item[-1]]
+                    
+                    # a new subpath starts wherever the last one didn't end
+                    if item[0] in ("re", "qu") or end is None or points[0] != end:
+                        drawings.append(LayoutItem("LTCurve"))
+                    
+                    for p in points:
+                        drawings[-1].addPoint(*point(p.x, p.y))
+                    
+                    end = None if item[0] in ("re", "qu") else points[-1]
+        
+        return drawings
+    
+    # pdfquery adds the annotations of the page as Annot elements, with their Rect as it is in the pdf
+    def pageAnnots(doc, page) -> list[dict[str, str]]:
+        annots = []
+        
+        for xref, *_ in page.annot_xrefs():
+            kind, rect = doc.xref_get_key(xref, "Rect")
+            rect = rect.strip("[] ").split()
+            
+            if kind == "array" and len(rect) == 4:
+                annots.append({"x0": rect[0], "y0": rect[1], "x1": rect[2], "y1": rect[3]})
+            else:
+                annots.append({})
+        
+        return annots
+    
+    # Chars that follow each other and are on the same line become lines (LTLayoutContainer.group_objects)
+    def groupChars(chars:list[LayoutItem]) -> list[LayoutItem]:
+        lines:list[LayoutItem] = []
+        line = None
+        
+        for obj0, obj1 in zip(chars, chars[1:]):
+            voverlap = obj1.y0 <= obj0.y1 and obj0.y0 <= obj1.y1
+            hoverlap = obj1.x0 <= obj0.x1 and obj0.x0 <= obj1.x1
+            vdistance = min(abs(obj0.y0 - obj1.y1), abs(obj0.y1 - obj1.y0))
+            hdistance = min(abs(obj0.x0 - obj1.x1), abs(obj0.x1 - obj1.x0))
+            
+            halign = (
+                voverlap
+                and min(obj0.height, obj1.height) * PDFLayout.LINE_OVERLAP < vdistance
+                and (0 if hoverlap else hdistance) < max(obj0.width, obj1.width) * PDFLayout.CHAR_MARGIN
+            )
+            valign = (
+                hoverlap
+                and min(obj0.width, obj1.width) * PDFLayout.LINE_OVERLAP < hdistance
+                and (0 if voverlap else vdistance) < max(obj0.height, obj1.height) * PDFLayout.CHAR_MARGIN
+            )
+            
+            if line is not None and ((halign and not line.vertical) or (valign and line.vertical)):
+                PDFLayout.addChar(line, obj1)
+            elif line is not None:
+                lines.append(PDFLayout.endLine(line))
+                line = None
+            elif valign and not halign:
+                line = LayoutItem("LTTextLineVertical", "", vertical=True)
+                PDFLayout.addChar(line, obj0)
+                PDFLayout.addChar(line, obj1)
+            elif halign and not valign:
+                line = LayoutItem("LTTextLineHorizontal", "")
+                PDFLayout.addChar(line, obj0)
+                PDFLayout.addChar(line, obj1)
+            else:
+                line = LayoutItem("LTTextLineHorizontal", "")
+                PDFLayout.addChar(line, obj0)
+                lines.append(PDFLayout.endLine(line))
+                line = None
+        
+        if line is None:
+            line = LayoutItem("LTTextLineHorizontal", "")
+            PDFLayout.addChar(line, chars[-1])
+        lines.append(PDFLayout.endLine(line))
+        
+        return lines
+    
+    # Adds a char to a line, with a space before it if it is far enough from the last one (LTTextLineHorizontal.add)
+    def addChar(line:LayoutItem, char:LayoutItem):
+        margin = PDFLayout.WORD_MARGIN * max(char.width, char.height)
+        
+        if line.items:
+            last = line.items[-1]
+            if (not line.vertical and last.x1 < char.x0 - margin) or (line.vertical and char.y1 + margin < last.y0):
+                line.text += " "
+        
+        line.text += char.text
+        line.add(char)
+    
+    # LTTextLine.analyze ends every line with a newline
+    def endLine(line:LayoutItem) -> LayoutItem:
+        line.text += "\n"
+        return line
+    
+    # Lines that are the same size, close and aligned become boxes (LTLayoutContainer.group_textlines)
+    def groupLines(lines:list[LayoutItem]) -> list[LayoutItem]:
+        boxes:dict[int, list[LayoutItem]] = {}
+        
+        for line in lines:
+            members = [line]
+            
+            for other in PDFLayout.neighbours(line, lines):
+                members.append(other)
+                if id(other) in boxes:
+                    members.extend(boxes.pop(id(other)))
+            
+            box:list[LayoutItem] = []
+            for member in members:
+                if member not in box:
+                    box.append(member)
+                    boxes[id(member)] = box
+        
+        result:list[LayoutItem] = []
+        done = set()
+        
+        for line in lines:
+            box = boxes[id(line)]
+            if id(box) in done:
+                continue
+            done.add(id(box))
+            
+            if line.vertical:
+                item = LayoutItem("LTTextBoxVertical", vertical=True)
+            else:
+                item = LayoutItem("LTTextBoxHorizontal")
+            
+            for member in box:
+                item.add(member)
+            
+            # LTTextBoxHorizontal reads its lines top to bottom, LTTextBoxVertical right to left
+            if item.vertical:
+                item.items.sort(key=lambda l: -l.x1)
+            else:
+                item.items.sort(key=lambda l: -l.y1)
+            
+            item.text = "".join(l.text for l in item.items)
+            result.append(item)
+        
+        return result
+    
+    # LTTextLineHorizontal.find_neighbors / LTTextLineVertical.find_neighbors, a line is its own neighbour
+    def neighbours(line:LayoutItem, lines:list[LayoutItem]) -> list[LayoutItem]:
+        if line.vertical:
+            d = PDFLayout.LINE_MARGIN * line.width
+            area = (line.x0 - d, line.y0, line.x1 + d, line.y1)
+            same = lambda o: abs(o.width - line.width) <= d and (
+                abs(o.y0 - line.y0) <= d or abs(o.y1 - line.y1) <= d or abs((o.y0 + o.y1) / 2 - (line.y0 + line.y1) / 2) <= d)
+        else:
+            d = PDFLayout.LINE_MARGIN * line.height
+            area = (line.x0, line.y0 - d, line.x1, line.y1 + d)
+            same = lambda o: abs(o.height - line.height) <= d and (
+                abs(o.x0 - line.x0) <= d or abs(o.x1 - line.x1) <= d or abs((o.x0 + o.x1) / 2 - (line.x0 + line.x1) / 2) <= d)
+        
+        return [other for other in lines if other.vertical == line.vertical and other.overlaps(*area) and same(other)]
+    
+    # Merges the closest pair of boxes / groups until one group is left (LTLayoutContainer.group_textboxes)
+    # pdfminer breaks ties between equally close pairs by id(), this uses the order the boxes were made in
+    def groupBoxes(boxes:list[LayoutItem]) -> LayoutItem:
+        
+        def dist(obj1, obj2):
+            return (max(obj1.x1, obj2.x1) - min(obj1.x0, obj2.x0)) * (max(obj1.y1, obj2.y1) - min(obj1.y0, obj2.y0)) \
+                - obj1.width * obj1.height - obj2.width * obj2.height
+        
+        # is there anything else between the two
+        def isany(obj1, obj2):
+            area = (min(obj1.x0, obj2.x0), min(obj1.y0, obj2.y0), max(obj1.x1, obj2.x1), max(obj1.y1, obj2.y1))
+            return any(obj is not obj1 and obj is not obj2 and obj.overlaps(*area) for obj in plane.values())
+        
+        plane = dict(enumerate(boxes))
+        next_id = len(boxes)
+        
+        dists = [(False, dist(boxes[i], boxes[j]), i, j) for i in range(len(boxes)) for j in range(i + 1, len(boxes))]
+        heapq.heapify(dists)
+        
+        while dists:
+            skip_isany, d, id1, id2 = heapq.heappop(dists)
+            
+            # skip pairs that were already merged
+            if id1 not in plane or id2 not in plane:
+                continue
+            
+            obj1, obj2 = plane[id1], plane[id2]
+            
+            if not skip_isany and isany(obj1, obj2):
+                heapq.heappush(dists, (True, d, id1, id2))
+                continue
+            
+            group = LayoutItem("LTTextGroup", vertical=obj1.vertical or obj2.vertical, group=True)
+            group.add(obj1)
+            group.add(obj2)
+            
+            del plane[id1], plane[id2]
+            
+            for other_id, other in plane.items():
+                heapq.heappush(dists, (False, dist(group, other), next_id, other_id))
+            plane[next_id] = group
+            next_id += 1
+        
+        return list(plane.values())[0]
+    
+    # Orders the groups top left to bottom right (LTTextGroupLRTB) or top right to bottom left (LTTextGroupTBRL)
+    # and lists the boxes depth first (IndexAssigner)
+    def walk(item:LayoutItem, order:list[LayoutItem]):
+        if not item.group:
+            order.append(item)
+            return
+        
+        flow = PDFLayout.BOXES_FLOW
+        if item.vertical:
+            item.items.sort(key=lambda o: -(1 + flow) * (o.x0 + o.x1) - (1 - flow) * o.y1)
+        else:
+            item.items.sort(key=lambda o: (1 - flow) * o.x0 - (1 + flow) * (o.y0 + o.y1))
+        
+        for child in item.items:
+            PDFLayout.walk(child, order)
+    
+    # Builds the page's xml tree like PDFQuery.get_tree and reads it like TransferParser.extractTextPdfquery
+    def treeText(items:list[LayoutItem], annots:list[dict[str, str]]) -> list[str]:
+        page = etree.Element("LTPage")
+        
+        for item in items:
+            PDFLayout.appendSorted(page, PDFLayout.xmlize(item, page))
+        for annot in annots:
+            PDFLayout.appendSorted(page, etree.Element("Annot", annot))
+        
+        PDFLayout.cleanText(page)
+        
+        stuff:list[str] = []
+        
+        for box in page.iter("LTTextBoxHorizontal"):
+            for i in box.xpath("child::text()|child::*"):
+                # elements without text would be printed as "<Element ...>" by pdfquery, that is never a line we want
+                if isinstance(i, str):
+                    stuff.append(i.strip())
+                elif i.text is not None:
+                    stuff.append(i.text.strip())
+        
+        return stuff
+    
+    # PDFQuery._xmlize: chars are merged into the text of their line, everything else is moved into the
+    # first element it fits inside, anywhere on the page
+    def xmlize(item:LayoutItem, page) -> etree._Element:
+        attrs = {}
+        if item.x0 <= item.x1:
+            attrs = {"x0": str(round(item.x0, 3)), "y0": str(round(item.y0, 3)), "x1": str(round(item.x1, 3)), "y1": str(round(item.y1, 3))}
+        
+        branch = etree.Element(item.tag, attrs)
+        
+        if item.text is not None:
+            branch.text = PDFLayout.INVALID_XML_CHARS.sub("", item.text)
+        
+        for child in item.items:
+            if child.tag != "LTChar":
+                PDFLayout.appendSorted(page, PDFLayout.xmlize(child, page))
+        
+        return branch
+    
+    # pdfquery._append_sorted
+    def appendSorted(root, el):
+        for child in root:
+            rel = PDFLayout.compareBBox(el, child)
+            if rel > 0:
+                PDFLayout.appendSorted(child, el)
+                return
+            if rel < 0:
+                PDFLayout.appendSorted(el, child)
+        root.append(el)
+    
+    # pdfquery._comp_bbox: 1 if el is inside el2, -1 if el2 is inside el, otherwise 0
+    def compareBBox(el, el2) -> int:
+        a = PDFLayout.bbox(el)
+        b = PDFLayout.bbox(el2)
+        if a is None or b is None:
+            return 0
+        
+        if b[0] <= a[0] and b[2] >= a[2] and b[1] <= a[1] and b[3] >= a[3]:
+            return 1
+        if a[0] <= b[0] and a[2] >= b[2] and a[1] <= b[1] and a[3] >= b[3]:
+            return -1
+        return 0
+    
+    # Returns (x0, y0, x1, y1) of an element, or None if it doesn't have a bbox
+    def bbox(el) -> tuple[float, float, float, float] | None:
+        try:
+            return float(el.get("x0")), float(el.get("y0")), float(el.get("x1")), float(el.get("y1"))
+        except TypeError:
+            return None
+    
+    # PDFQuery._clean_text: normalizes whitespace and removes the text of each child from its parent
+    # An element without text stops the parent from being cleaned any further, like it does in pdfquery
+    def cleanText(branch):
+        if branch.text:
+            branch.text = re.sub(r"\s+", " ", branch.text)
+        
+        for child in branch:
+            PDFLayout.cleanText(child)
+            
+            if branch.text:
+                if child.text is None:
+                    return
+                if branch.text.find(child.text) >= 0:
+                    branch.text = branch.text.replace(child.text, "", 1)
@@ -1,9 +1,10 @@
 from bs4 import BeautifulSoup
+import lxml.html
 
 import unicodedata
 import datetime
 
-from schema.Semester import Course, ScheduleEntry, Semester
+from schema.Semester import CourseRecord, ScheduleRecord, Semester, SemesterRecord, scheduleTypes
 
 
 
@@ -18,6 +19,10 @@ this classname is very deceptive: This class has methods for
 TODO: speed it up - it takes 3 mins to download and parse all 20 years of data :sob:
 '''
 
+# Bump this whenever a change to the parser changes what it outputs
+# Incremental rebuilds reparse every term that was parsed by an older version
+PARSER_VERSION = 1
+
 class SemesterParser:
     def __init__(self, year:int, semester:int) -> None:
         
@@ -44,16 +49,19 @@ Naturally there are a few caveats"
     Instead of storing that properly, we simply append that note to the end of all sections of a course.
 
 """
-# TODO: refactor this method to make it quicker
-def parseSemesterHTML(html) -> Semester:
-    courses_first_day = None
-    courses_last_day = None
-            
-    # use BeautifulSoup to change html to Python friendly format
-    soup = BeautifulSoup(html, 'lxml')
-
+# engine="lxml" reads the page with lxml directly instead of building a BeautifulSoup tree
+# Both engines produce identical semesters, lxml is just a lot faster
+# records=True returns a SemesterRecord instead, which skips building and validating a pydantic model for every section
+def parseSemesterHTML(html, engine="bs4", records=False) -> Semester | SemesterRecord:
+    if engine == "bs4":
+        title, cells = _readCellsBS4(html)
+    elif engine == "lxml":
+        title, cells = _readCellsLxml(html)
+    else:
+        raise Exception(f"Unknown parser engine {engine}. Engine must be bs4 or lxml.")
+    
     # "Course Search For Spring 2023" is the only h2 on the page
-    title = soup.find("h2").text.split()
+    title = title.split()
     year = int( title[-1] )
     if "Spring" in title:
         term = 10
@@ -62,25 +70,22 @@ def parseSemesterHTML(html) -> Semester:
     if "Fall" in title:
         term = 30
         
-    semester = Semester(year=year, term=term)
-            
-    # Begin parsing HTML 
-    table1 = soup.find("table", class_="dataentrytable")
-
+    semester = SemesterRecord(year, term)
+    
     # do not parse information we do not need (headers, lines and course headings)
     rawdata:list[str] = []
-    for i in table1.find_all("td"):
+    for classes, colspan, txt in cells:
                     
         # remove the grey separator lines
-        if "deseparator" in i["class"]: 
+        if "deseparator" in classes: 
             continue
         
         # if a comment is >2 lines, theres whitespace added underneath, this removes them
-        if "colspan" in i.attrs and i.attrs["colspan"] == "22":
+        if colspan == "22":
             continue
         
         # fix unicode encoding
-        txt = unicodedata.normalize("NFKD", i.text)
+        txt = unicodedata.normalize("NFKD", txt)
         
         # remove the yellow headers
         if txt == "Instructor(s)":
@@ -98,6 +103,97 @@ def parseSemesterHTML(html) -> Semester:
         
         rawdata.append(txt)
 
+    semester = _parseRawData(semester, rawdata)
+    
+    if records:
+        return semester
+    return semester.toModel()
+
+# Both readers return the page title and (classes, colspan, text) for every cell of the course table
+
+def _readCellsBS4(html) -> tuple[str, list[tuple[list[str], str | None, str]]]:
+    # use BeautifulSoup to change html to Python friendly format
+    soup = BeautifulSoup(html, 'lxml')
+    
+    title = soup.find("h2").text
+    table1 = soup.find("table", class_="dataentrytable")
+    
+    # no sections found
+    if table1 is None:
+        return title, []
+    
+    cells = []
+    for i in table1.find_all("td"):
+        cells.append((i["class"], i.attrs.get("colspan"), i.text))
+    
+    return title, cells
+
+def _readCellsLxml(html) -> tuple[str, list[tuple[list[str], str | None, str]]]:
+    root = lxml.html.fromstring(html)
+    
+    title = root.xpath("string((//h2)[1])")
+    table1 = _findTableLxml(root)
+    
+    # no sections found
+    if table1 is None:
+        return title, []
+    
+    cells = []
+    for i in table1.iter("td"):
+        cells.append((i.get("class", "").split(), i.get("colspan"), i.text_content()))
+    
+    return title, cells
+
+def _findTableLxml(root):
+    table = root.xpath("(//table[contains(concat(' ', normalize-space(@class), ' '), ' dataentrytable ')])[1]")
+    if len(table) == 0:
+        return None
+    return table[0]
+
+# Parses pages that each hold the sections of some of the subjects in a term, and merges them into one semester
+def parseSemesterShards(pages:list[str], engine="bs4", records=False) -> Semester | SemesterRecord:
+    semester = None
+    
+    for page in pages:
+        shard = parseSemesterHTML(page, engine, records)
+        
+        if semester is None:
+            semester = shard
+        else:
+            semester.courses.extend(shard.courses)
+    
+    return semester
+
+# Merges pages that each hold the sections of some of the subjects in a term into one page
+# Rows from every page are appended to the course table of the first page, so it parses the same as if it was downloaded in one request
+def mergeSemesterHTML(pages:list[str]) -> str:
+    base = None
+    base_table = None
+    
+    for page in pages:
+        root = lxml.html.fromstring(page)
+        table = _findTableLxml(root)
+        
+        if table is None:
+            continue
+        
+        if base is None:
+            base = root
+            base_table = table
+            continue
+        
+        for row in list(table):
+            base_table.append(row)
+    
+    if base is None:
+        return pages[0]
+    
+    return lxml.html.tostring(base, encoding="unicode")
+
+def _parseRawData(semester:SemesterRecord, rawdata:list[str]) -> SemesterRecord:
+    courses_first_day = None
+    courses_last_day = None
+    
     # Begin parsing data
     # Please note that this is a very cursed and fragile implementation
     # You probably shouldn't touch it
@@ -134,16 +230,17 @@ def parseSemesterHTML(html) -> Semester:
         if rpt == "-":
             rpt = None  
                     
-        current_course = Course(
+        # records aren't validated, so anything pydantic would have coerced is converted here
+        current_course = CourseRecord(
             RP          = formatProp(rawdata[i]),
             seats       = formatProp(rawdata[i+1]),
             waitlist    = formatProp(rawdata[i+2]),
             # skip the select column
-            crn         = formatProp(rawdata[i+4]),
+            crn         = int(formatProp(rawdata[i+4])),
             subject     = rawdata[i+5],
-            course_code = formatProp(rawdata[i+6]),
+            course_code = int(formatProp(rawdata[i+6])),
             section     = rawdata[i+7],
-            credits     = formatProp(rawdata[i+8]),
+            credits     = float(formatProp(rawdata[i+8])),
             title       = rawdata[i+9],
             add_fees    = fee,
             rpt_limit   = rpt,
@@ -166,10 +263,10 @@ def parseSemesterHTML(html) -> Semester:
             
             # sanity check
             if rawdata[i] not in [" ", "CO-OP(on site work experience)", "Lecture", "Lab", "Seminar", "Practicum","WWW", "On Site Work", "Exchange-International", "Tutorial", "Exam", "Field School", "Flexible Assessment", "GIS Guided Independent Study"]:
-                raise Exception(f"Parsing error: unexpected course type found: {rawdata[i]}. {current_course} in course {current_course.toJSON()}")
+                raise Exception(f"Parsing error: unexpected course type found: {rawdata[i]}. {current_course}")
                                     
-            c = ScheduleEntry(
-                type       = rawdata[i],
+            c = ScheduleRecord(
+                type       = scheduleTypes(rawdata[i]),
                 days       = rawdata[i+1],
                 time       = rawdata[i+2], 
                 start      = formatDate(rawdata[i+3]), 
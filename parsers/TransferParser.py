@@ -1,145 +1,235 @@
-import pdfquery
 import os
+from io import BytesIO
+from typing import Iterable
 
 from schema.Transfer import Transfer
 
+# pdfquery and PyMuPDF are only imported by the engine that uses them, so the version numbers and
+# parseText can be used without loading either
 class TransferParser:
     
+    # Bump this whenever a change to the parser changes what it outputs
+    PARSER_VERSION = 1
     
-    # TODO: use PyMuPDF to speed this up   
-    def parseTransferPDFs() -> list[Transfer]:
-        pdfs = os.listdir("downloads/")
+    # Bump this whenever a change to extractTextPdfquery or extractTextPyMuPDF changes what they output
+    # The extracted text is cached in the database for each engine, anything cached by an older version is extracted again
+    EXTRACTOR_VERSION = 2
+    
+    # engine="pymupdf" reads the text with PyMuPDF instead of building a pdfminer layout tree with pdfquery
+    # PyMuPDF is opt-in: it is a lot faster and lays the text out like pdfminer, but text inside form xobjects isn't handled yet
+    # Only make it the default once Utilities.compareTransferParsers runs clean on every stored PDF (see tests/test_transfer_parsers.py)
+    def parseTransferPDFs(dir="downloads/", engine="pdfquery") -> list[Transfer]:
+        pdfs = os.listdir(dir)
         
         assert len(pdfs) > 0, f"No PDFs to parse in {dir}."
         
         transfers: list[Transfer] = []
                         
         for p in pdfs:
+            transfers.extend(TransferParser.parseTransferPDF(dir + p, engine))
+        
+        return transfers
+    
+    # Parses (subject, pdf bytes) pairs, e.g. straight from Database.iterTransferPDF, without writing them to disk
+    def parseStoredTransferPDFs(pdfs:Iterable[tuple[str, bytes]], engine="pdfquery") -> list[Transfer]:
+        transfers: list[Transfer] = []
+        
+        for subject, pdf in pdfs:
+            transfers.extend(TransferParser.parseTransferPDF(pdf, engine, subject))
+        
+        return transfers
+    
+    # pdf is either a path or the bytes of a pdf
+    def parseTransferPDF(pdf, engine="pdfquery", name=None) -> list[Transfer]:
+        if name is None:
+            name = os.path.basename(pdf)
+        
+        return TransferParser.parseTransferText(TransferParser.extractText(pdf, engine), name)
+    
+    # Parses text boxes that were already extracted from a pdf (see Database.getTransferText)
+    def parseTransferText(stuff:list[str], name) -> list[Transfer]:
+        print(f"Parsed {name} - {stuff[1]}.")
+        return TransferParser.parseText(stuff)
+    
+    def extractText(pdf, engine="pdfquery") -> list[str]:
+        if engine == "pymupdf":
+            return TransferParser.extractTextPyMuPDF(pdf)
+        elif engine == "pdfquery":
+            return TransferParser.extractTextPdfquery(pdf)
+        else:
+            raise Exception(f"Unknown PDF engine {engine}. Engine must be pymupdf or pdfquery.")
+    
+    # Reads the subject from the title of a pdf
+    # e.g. "Course Search Result from Langara CPSC courses"
+    def headerSubject(stuff:list[str]) -> str:
+        return stuff[0].split()[5]
+    
+    # Reads (agreements, courses, institutions) from the header of a pdf
+    # e.g. "217 agreements found for 15 courses at 17 institutions"
+    def headerCounts(stuff:list[str]) -> tuple[int | None, int | None, int | None]:
+        try:
+            header = stuff[1].split()
+            return int(header[0]), int(header[4]), int(header[7])
+        except (IndexError, ValueError):
+            return None, None, None
+    
+    # Returns the text of every text box in the pdf
+    def extractTextPdfquery(pdf) -> list[str]:
+        import pdfquery
+        
+        if isinstance(pdf, bytes):
+            pdf = BytesIO(pdf)
+        
+        pdf = pdfquery.PDFQuery(pdf)
+        pdf.load()
 
-            pdf = pdfquery.PDFQuery("downloads/" + p)
-            pdf.load()
-
-            # save xml
-            #pdf.tree.write("pain.xml", pretty_print=True)
+        # save xml
+        #pdf.tree.write("pain.xml", pretty_print=True)
 
-            pyquery = pdf.pq("LTTextBoxHorizontal")
+        pyquery = pdf.pq("LTTextBoxHorizontal")
 
-            stuff:list[str] = []
+        stuff:list[str] = []
 
-            for i in pyquery.contents():
-                
-                # for some reason some elements become lxml.etree._ElementUnicodeResult 
-                # and others become pdfquery.pdfquery.LayoutElement
-                # ???
-                # TODO: make this not terrible
-                
-                
+        for i in pyquery.contents():
+            
+            # for some reason some elements become lxml.etree._ElementUnicodeResult 
+            # and others become pdfquery.pdfquery.LayoutElement
+            # ???
+            # TODO: make this not terrible
+            
+            
+            try:
+                stuff.append(i.text.strip())
+            except:    
                 try:
-                    stuff.append(i.text.strip())
-                except:    
-                    try:
-                        stuff.append(str(i).strip())
-                    except:
-                        print(f"Could not save {i} {type(i)}")
-                        
-                # don't save empty ones (idk why there are empty ones)
-                # WHY DOESNT THIS WORK
-                if stuff[-1].isspace():
-                    stuff.pop(-1)
-
-            while "" in stuff:
-                stuff.remove("")
+                    stuff.append(str(i).strip())
+                except:
+                    print(f"Could not save {i} {type(i)}")
                     
-            '''
-            Remove the following:
-            Course Search Result from "Course Loads"
-            217 agreements found for 15 courses at 17 institutions
-            Generated Apr 9, 2023
-            1 of 23
-            From
-            To
-            Transfer Credit
-            Effective Date
-            '''
+            # don't save empty ones (idk why there are empty ones)
+            # WHY DOESNT THIS WORK
+            if stuff[-1].isspace():
+                stuff.pop(-1)
 
-            '''
-            Parsing something like this:
-            LANG ABST 1100
-            (there may or may not be a 1 or 2 line description here)
-            Credits: 3
-            Langara College (BC)
-            CAPU
-            CAPU HIST 209 (3)
-            May/03 to
-            present (sometimes present is on the same line as above)
-            '''
-            print(f"Parsed {p} - {stuff[1]}.")
-            #print(stuff[0:50])
-            
-            # sometimes the 1 of 23 pagecount doesn't show up????
-            if "of" in stuff[3]:
-                stuff = stuff[8:]
-            else:
-                stuff = stuff[7:]
+        while "" in stuff:
+            stuff.remove("")
+        
+        return stuff
+    
+    # Returns the same text as extractTextPdfquery, without pdfminer (see parsers/PDFLayout.py)
+    def extractTextPyMuPDF(pdf) -> list[str]:
+        import fitz
+        from parsers.PDFLayout import PDFLayout
+        
+        stuff:list[str] = []
+        
+        if isinstance(pdf, bytes):
+            doc = fitz.open(stream=pdf, filetype="pdf")
+        else:
+            doc = fitz.open(pdf)
+        
+        with doc:
+            for page in doc:
+                stuff.extend(PDFLayout.pageText(doc, page))
+        
+        while "" in stuff:
+            stuff.remove("")
+        
+        return stuff
+    
+    # Parses the text boxes of one pdf into transfers
+    def parseText(stuff:list[str]) -> list[Transfer]:
+        transfers: list[Transfer] = []
+        
+        '''
+        Remove the following:
+        Course Search Result from "Course Loads"
+        217 agreements found for 15 courses at 17 institutions
+        Generated Apr 9, 2023
+        1 of 23
+        From
+        To
+        Transfer Credit
+        Effective Date
+        '''
 
-            i = 0
-            while i < len(stuff):
-                
-                title = stuff[i].split(" ")
-                i += 1
-                    
-                while "Credits:" not in stuff[i]:
-                    description = stuff[i]
-                    i += 1
-                
-                # we don't need the # of credits
-                # credit = float(stuff[i].split(":")[-1])
-                i += 1
-                
-                i += 1 # skip Langara College (BC)
+        '''
+        Parsing something like this:
+        LANG ABST 1100
+        (there may or may not be a 1 or 2 line description here)
+        Credits: 3
+        Langara College (BC)
+        CAPU
+        CAPU HIST 209 (3)
+        May/03 to
+        present (sometimes present is on the same line as above)
+        '''
+        #print(stuff[0:50])
+        
+        # sometimes the 1 of 23 pagecount doesn't show up????
+        if "of" in stuff[3]:
+            stuff = stuff[8:]
+        else:
+            stuff = stuff[7:]
+
+        i = 0
+        while i < len(stuff):
+            
+            title = stuff[i].split(" ")
+            i += 1
                 
-                dest = stuff[i]
+            while "Credits:" not in stuff[i]:
+                description = stuff[i]
                 i += 1
-                
-                
-                #print("Getting transfer info:")
+            
+            # we don't need the # of credits
+            # credit = float(stuff[i].split(":")[-1])
+            i += 1
+            
+            i += 1 # skip Langara College (BC)
+            
+            dest = stuff[i]
+            i += 1
+            
+            
+            #print("Getting transfer info:")
+            #print(stuff[i])
+            transfer = stuff[i]
+            i += 1
+            
+            while stuff[i][6:9] != " to" or (not stuff[i][4:6].isnumeric() and not stuff[i][3] == "/"):
                 #print(stuff[i])
-                transfer = stuff[i]
+
+                transfer += " " + stuff[i]
                 i += 1
                 
-                while stuff[i][6:9] != " to" or (not stuff[i][4:6].isnumeric() and not stuff[i][3] == "/"):
-                    #print(stuff[i])
-
-                    transfer += " " + stuff[i]
-                    i += 1
-                    
-                validity = stuff[i].split("to")
-                start = validity[0].strip()
+            validity = stuff[i].split("to")
+            start = validity[0].strip()
+            i += 1
+            
+            
+            if len(validity) == 2 and validity[1] != "":
+                end = validity[1].strip()
+            else:
+                # if there is a second line
+                end = stuff[i].strip()
                 i += 1
                 
                 
-                if len(validity) == 2 and validity[1] != "":
-                    end = validity[1].strip()
-                else:
-                    # if there is a second line
-                    end = stuff[i].strip()
-                    i += 1
-                    
-                    
-                transfers.append(Transfer(
-                    subject = title[1],
-                    course_code = title[2],
-                    source=title[0],
-                    destination=dest, 
-                    credit=transfer,
-                    effective_start=start,
-                    effective_end=end,
-                ))
+            transfers.append(Transfer(
+                subject = title[1],
+                course_code = title[2],
+                source=title[0],
+                destination=dest, 
+                credit=transfer,
+                effective_start=start,
+                effective_end=end,
+            ))
+            
+            # why is 8 of 23 here??? what about 1-7 of 23???
+            # i don't know why only some of the page numbers show up :sob:
+            while i < len(stuff) and " of " in stuff[i]:
+                i += 1
                 
-                # why is 8 of 23 here??? what about 1-7 of 23???
-                # i don't know why only some of the page numbers show up :sob:
-                while i < len(stuff) and " of " in stuff[i]:
-                    i += 1
-                    
         return transfers
                 
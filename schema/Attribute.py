@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr, TypeAdapter
 
 
 # TODO: redo this whole schema?
@@ -6,16 +6,21 @@ class Attribute(BaseModel):
     subject: str
     course_code: int
     attributes: dict[str, bool] # could use 'attributes' here but it bugs out
-    
-    def __init__(__pydantic_self__, **data: any) -> None:
-        super().__init__(**data)
+
+AttributeList = TypeAdapter(list[Attribute])
 
 class Attributes(BaseModel):
     attributes:list[Attribute] = []
     
+    # (subject, course_code) -> first attribute added with that key
+    _index:dict[tuple[str, int], Attribute] = PrivateAttr(default_factory=dict)
+    
     def __init__(__pydantic_self__, **data: any) -> None:
         super().__init__(**data)
         
+        for a in __pydantic_self__.attributes:
+            __pydantic_self__._index.setdefault((a.subject, a.course_code), a)
+        
     def __repr__(self) -> str:
         return f"Attributes: {len(self.attributes)} courses."
 
@@ -25,12 +30,17 @@ class Attributes(BaseModel):
         
     def addAttrib(self,  attribute: Attribute):
         self.attributes.append(attribute) 
+        self._index.setdefault((attribute.subject, attribute.course_code), attribute)
     
     def addAttribSkipDuplicates(self, attribute: Attribute):
         
-        for c in self.attributes:
-            if c.subject == attribute.subject and c.course_code == attribute.course_code:
-                return None
+        if self.hasAttrib(attribute.subject, attribute.course_code):
+            return None
 
-        self.attributes.append(attribute)
-        
\ No newline at end of file
+        self.addAttrib(attribute)
+    
+    def hasAttrib(self, subject:str, course_code:int) -> bool:
+        return (subject, int(course_code)) in self._index
+    
+    def getAttrib(self, subject:str, course_code:int) -> Attribute | None:
+        return self._index.get((subject, int(course_code)))
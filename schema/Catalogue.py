@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr, TypeAdapter
 
 
 class CatalogueCourse(BaseModel):
@@ -8,16 +8,20 @@ class CatalogueCourse(BaseModel):
     hours: dict[str, float] # {"lecture" : 3, "seminar" : 0, "lab" : 0}
     title: str #  Canadian Aboriginal Experience 
     description: str # not pasting the whole description here
-    
-    # this is really the proper way to do it???
-    def __init__(__pydantic_self__, **data: any) -> None:
-        super().__init__(**data)
+
+CatalogueCourseList = TypeAdapter(list[CatalogueCourse])
 
 class Catalogue(BaseModel):
     courses:list[CatalogueCourse] = []
+    
+    # (subject, course_code) -> first course added with that key
+    _index:dict[tuple[str, int], CatalogueCourse] = PrivateAttr(default_factory=dict)
 
     def __init__(__pydantic_self__, **data: any) -> None:
         super().__init__(**data)
+        
+        for c in __pydantic_self__.courses:
+            __pydantic_self__._index.setdefault((c.subject, c.course_code), c)
     
     def __repr__(self) -> str:
         return f"Catalogue: {len(self.courses)} courses."
@@ -27,12 +31,17 @@ class Catalogue(BaseModel):
     
     def addCourse(self, course:CatalogueCourse):
         self.courses.append(course) 
+        self._index.setdefault((course.subject, course.course_code), course)
     
     def addCourseSkipDuplicates(self, course:CatalogueCourse):
         
-        for c in self.courses:
-            if c.subject == course.subject and c.course_code == course.course_code:
-                return None
+        if self.hasCourse(course.subject, course.course_code):
+            return None
             
-        self.courses.append(course)
-    
\ No newline at end of file
+        self.addCourse(course)
+    
+    def hasCourse(self, subject:str, course_code:int) -> bool:
+        return (subject, int(course_code)) in self._index
+    
+    def getCourse(self, subject:str, course_code:int) -> CatalogueCourse | None:
+        return self._index.get((subject, int(course_code)))
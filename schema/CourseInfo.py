@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from enum import Enum
 from datetime import datetime
 
@@ -15,6 +15,9 @@ class availability(Enum):
     all =           "All Semesters"
     unknown =       "Unknown"
     discontinued =  "Discontinued"
+
+# CourseInfo has a field called availability, which hides the enum inside the class
+_availability = availability
     
 class attributes(Enum):
     AR =  "2AR"
@@ -51,7 +54,7 @@ class CourseInfo(BaseModel):
     hours: dict[str, float] | None = Field(description="Hours of the course (lecture, seminar & lab)")
     add_fees: float | None    = Field(description="Additional fees (in dollars).")
     rpt_limit: int | None     = Field(description="Repeat limit. ```0``` means there is no repeat limit.")
-    availability: 'availability'            = Field(description="Availability of course. Extracted automatically - may not be correct. Consult langara advisors if in doubt.")
+    availability: _availability             = Field(description="Availability of course. Extracted automatically - may not be correct. Consult langara advisors if in doubt.")
     prev_offered : list[int]                = Field(description="last 5 semesters the course was offered e.g. ```[202310, 202210, 202010, 201910, 201810]```. Note that cancelled sections are included.")
     # how do i get this to show on docs???
     attributes : dict[str, bool] | None  = Field(description="Langara attributes for a course.")
@@ -61,41 +64,42 @@ class CourseInfo(BaseModel):
     
     offered: list[Course] | None # used internally 
     
-    class Config:
-        schema_extra = {
-            "example": {
-                "RP" : None,
-                "subject" : "CPSC",
-                "course_code" : 1050,
-                "credits" : 3.0,
-                "title": "Introduction to Computer Science",
-                "description" : "Offers a broad overview of the computer science discipline.  Provides students with an appreciation for and an understanding of the many different aspects of the discipline.  Topics include information and data representation; introduction to computer hardware and programming; networks; applications (e.g., spreadsheet, database); social networking; ethics; and history.  Intended for both students expecting to continue in computer science as well as for those taking it for general interest.",
-                "hours": {
-                    "lecture": 4,
-                    "seminar": 0,
-                    "lab": 2
-                },
-                "add_fees" : 34.,
-                "rpt_limit" : 2,
-                "availability" : availability.all,
-                "prev_offered" : [202320, 202310, 202230, 202220, 202210],
-                "attributes" : {
-                    "2AR" : False,
-                    "2SC" : False,
-                    "HUM" : False,
-                    "LSC" : False,
-                    "SCI" : True,
-                    "SOC" : False,
-                    "UT" :  True,
-                },
-                "transfer" : [
-                    Transfer.Config.json_schema_extra["example1"],
-                    Transfer.Config.json_schema_extra["example2"]
-                    ],
-                "prerequisites" : None,
-                "restriction" : None,
-            }
+    model_config = ConfigDict(json_schema_extra = {
+        "example": {
+            "RP" : None,
+            "subject" : "CPSC",
+            "course_code" : 1050,
+            "credits" : 3.0,
+            "title": "Introduction to Computer Science",
+            "description" : "Offers a broad overview of the computer science discipline.  Provides students with an appreciation for and an understanding of the many different aspects of the discipline.  Topics include information and data representation; introduction to computer hardware and programming; networks; applications (e.g., spreadsheet, database); social networking; ethics; and history.  Intended for both students expecting to continue in computer science as well as for those taking it for general interest.",
+            "hours": {
+                "lecture": 4,
+                "seminar": 0,
+                "lab": 2
+            },
+            "add_fees" : 34.,
+            "rpt_limit" : 2,
+            "availability" : _availability.all,
+            "prev_offered" : [202320, 202310, 202230, 202220, 202210],
+            "attributes" : {
+                "2AR" : False,
+                "2SC" : False,
+                "HUM" : False,
+                "LSC" : False,
+                "SCI" : True,
+                "SOC" : False,
+                "UT" :  True,
+            },
+            "transfer" : [
+                Transfer.model_config["json_schema_extra"]["example1"],
+                Transfer.model_config["json_schema_extra"]["example2"]
+                ],
+            "prerequisites" : None,
+            "restriction" : None,
         }
+    })
+
+CourseInfoList = TypeAdapter(list[CourseInfo])
 
 class CourseInfoAll(BaseModel):
     datetime_retrieved: str = Field(
@@ -104,14 +108,10 @@ class CourseInfoAll(BaseModel):
         )
     courses: list[CourseInfo]    
     
-    def __init__(__pydantic_self__, **data: any) -> None:
-        super().__init__(**data)
-        
-    class Config:
-        schema_extra = {
-            "example": {
-                "courses" : [
-                    CourseInfo.Config.schema_extra["example"],
-                ]
-            }
-        }
\ No newline at end of file
+    model_config = ConfigDict(json_schema_extra = {
+        "example": {
+            "courses" : [
+                CourseInfo.model_config["json_schema_extra"]["example"],
+            ]
+        }
+    })
\ No newline at end of file
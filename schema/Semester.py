@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from dataclasses import dataclass, field
 from enum import Enum, IntEnum
 
 from datetime import datetime
@@ -34,18 +35,17 @@ class ScheduleEntry(BaseModel):
     room: str               = Field(description='Room session is in.')
     instructor: str         = Field(description='Instructor(s) for this session.')
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "type" : "Lecture",
-                "days" : "M-W----",
-                "time" : "1030-1220",
-                "start": None,
-                "end" : None,
-                "room": "A136B",
-                "instructor": "Adam Solomonian"
-            }
+    model_config = ConfigDict(json_schema_extra = {
+        "example": {
+            "type" : "Lecture",
+            "days" : "M-W----",
+            "time" : "1030-1220",
+            "start": None,
+            "end" : None,
+            "room": "A136B",
+            "instructor": "Adam Solomonian"
         }
+    })
         
     def isIn(self, schedules:list):
 
@@ -55,16 +55,50 @@ class ScheduleEntry(BaseModel):
         
         return False
         
-    # TODO: figure out how to do this properly
     def isEqual(self, sched):
         assert isinstance(sched, ScheduleEntry)
         
-        x = sched
-        return self.type == x.type and self.days == x.days and self.time == x.time and self.start == x.start and self.end == x.end and self.room == x.room and self.instructor == x.instructor
+        return self.key() == sched.key()
+    
+    # Canonical tuple of a schedule, in the same order as the Schedules table
+    def key(self) -> tuple:
+        return (self.type.value, self.days, self.time, self.start, self.end, self.room, self.instructor)
         
     def props(cls):   
         return [i for i in cls.__dict__.keys() if i[:1] != '_']
         
+# Days in the order they appear in ScheduleEntry.days, bit i of a day mask is DAYS[i]
+# e.g. "M-W----" -> 0b0000101, "-T-R---" -> 0b0001010
+DAYS = "MTWRFSU"
+
+def dayMask(days:str | None) -> int | None:
+    if days is None:
+        return None
+
+    mask = 0
+    for d in days:
+        if d in DAYS:
+            mask |= 1 << DAYS.index(d)
+    return mask
+
+# "1030" -> 630 minutes since midnight
+def minutes(hhmm:str | None) -> int | None:
+    if hhmm is None or len(hhmm) != 4 or not hhmm.isdigit():
+        return None
+    return int(hhmm[:2]) * 60 + int(hhmm[2:])
+
+# "1030-1220" -> (630, 740), sessions without a time (e.g. WWW) are (None, None)
+def timeRange(time:str | None) -> tuple[int | None, int | None]:
+    if time is None or len(time.split("-")) != 2:
+        return None, None
+
+    start, end = time.split("-")
+    start, end = minutes(start.strip()), minutes(end.strip())
+
+    if start is None or end is None:
+        return None, None
+    return start, end
+
 # https://langara.ca/reg-guide/before-you-register/search-for-courses.html
 
 class RPEnum(Enum):
@@ -101,33 +135,97 @@ class Course(BaseModel):
     def __str__(self):
         return f"Course: {self.subject} {self.course_code} CRN: {self.crn} {self.schedule}"
     
-    # TODO: figure out how to do this properly
+    # Sections are equal if every attribute and every schedule matches
     def isEqual(self, course):
         assert isinstance(course, Course)
         
-        return self.props() == course.props()
+        return self.key() == course.key() and self.scheduleKeys() == course.scheduleKeys()
+    
+    # Canonical tuple of everything except the schedule, in the same order as the Sections table
+    def key(self) -> tuple:
+        return (self.RP, self.seats, self.waitlist, self.crn, self.subject, self.course_code, self.section, self.credits, self.title, self.add_fees, self.rpt_limit, self.notes)
+    
+    # Order doesn't matter and duplicate schedules are only stored once
+    def scheduleKeys(self) -> frozenset[tuple]:
+        return frozenset(s.key() for s in self.schedule)
         
     def props(cls):   
         return [i for i in cls.__dict__.keys() if i[:1] != '_']
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "RP" : None,
-                "seats" : 8,
-                "waitlist" : 25,
-                "crn" : 20533,
-                "subject" : "ANTH",
-                "course" : 1120,
-                "section" : "001",
-                "credits" : 3.00,
-                "title" : "Intro to Cultural Anthropology",
-                "add_fees" : 0,
-                "rpt_limit" : None,
-                "notes" : None,
-                "schedule" : [ScheduleEntry.Config.json_schema_extra["example"]],
-            }
+    model_config = ConfigDict(json_schema_extra = {
+        "example": {
+            "RP" : None,
+            "seats" : 8,
+            "waitlist" : 25,
+            "crn" : 20533,
+            "subject" : "ANTH",
+            "course" : 1120,
+            "section" : "001",
+            "credits" : 3.00,
+            "title" : "Intro to Cultural Anthropology",
+            "add_fees" : 0,
+            "rpt_limit" : None,
+            "notes" : None,
+            "schedule" : [ScheduleEntry.model_config["json_schema_extra"]["example"]],
         }
+    })
+
+# Validate or serialize whole lists at once, e.g. CourseList.validate_python(rows) or CourseList.dump_json(courses)
+ScheduleEntryList = TypeAdapter(list[ScheduleEntry])
+CourseList = TypeAdapter(list[Course])
+
+# Lightweight versions of ScheduleEntry, Course and Semester, used between the parser and the database
+# They have the same fields (already coerced to the same types) but are never validated
+# Call toModel() to get the pydantic model
+@dataclass(slots=True)
+class ScheduleRecord:
+    type: scheduleTypes
+    days: str
+    time: str
+    start: str | None
+    end: str | None
+    room: str
+    instructor: str
+    
+    # same as ScheduleEntry.key
+    def key(self) -> tuple:
+        return (self.type.value, self.days, self.time, self.start, self.end, self.room, self.instructor)
+    
+    def toModel(self) -> ScheduleEntry:
+        return ScheduleEntry(type=self.type, days=self.days, time=self.time, start=self.start, end=self.end, room=self.room, instructor=self.instructor)
+
+@dataclass(slots=True)
+class CourseRecord:
+    RP: str | None
+    seats: int | str
+    waitlist: int | str | None
+    crn: int
+    subject: str
+    course_code: int
+    section: str | None
+    credits: float
+    title: str | None
+    add_fees: float | None
+    rpt_limit: int | None
+    notes: str | None
+    schedule: list[ScheduleRecord]
+    
+    def __str__(self):
+        return f"Course: {self.subject} {self.course_code} CRN: {self.crn} {self.schedule}"
+    
+    # same as Course.key
+    def key(self) -> tuple:
+        return (self.RP, self.seats, self.waitlist, self.crn, self.subject, self.course_code, self.section, self.credits, self.title, self.add_fees, self.rpt_limit, self.notes)
+    
+    def scheduleKeys(self) -> frozenset[tuple]:
+        return frozenset(s.key() for s in self.schedule)
+    
+    def toModel(self) -> Course:
+        return Course(
+            RP=self.RP, seats=self.seats, waitlist=self.waitlist, crn=self.crn, subject=self.subject, course_code=self.course_code, 
+            section=self.section, credits=self.credits, title=self.title, add_fees=self.add_fees, rpt_limit=self.rpt_limit, notes=self.notes,
+            schedule=[s.toModel() for s in self.schedule],
+        )
 
 class Semesters(IntEnum):
     spring = 10
@@ -176,21 +274,16 @@ class Semester(BaseModel):
         description='List of courses in semester.'
         )
     
-    # this is really the proper way to do it???
-    def __init__(__pydantic_self__, **data: any) -> None:
-        super().__init__(**data)
-        
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "datetime_retrieved" : "2023-04-04",
-                "year": Years._2023,
-                "semester" : Semesters.spring,
-                "courses_first_day" : "2023-5-08",
-                "courses_last_day" : "2023-8-31",
-                "courses" : [Course.Config.json_schema_extra["example"]]
-            }
+    model_config = ConfigDict(json_schema_extra = {
+        "example": {
+            "datetime_retrieved" : "2023-04-04",
+            "year": Years._2023,
+            "semester" : Semesters.spring,
+            "courses_first_day" : "2023-5-08",
+            "courses_last_day" : "2023-8-31",
+            "courses" : [Course.model_config["json_schema_extra"]["example"]]
         }
+    })
     
     def addCourse(self, course:Course):
         self.courses.append(course)
@@ -273,4 +366,19 @@ class Semester(BaseModel):
         #print("end:", e)
         logging.info(f"Semester {self.year}{self.semester} starts on {s} and ends on {e}.")
         self.courses_first_day = s
-        self.courses_last_day = e
\ No newline at end of file
+        self.courses_last_day = e
+
+@dataclass(slots=True)
+class SemesterRecord:
+    year: int
+    term: int
+    courses: list[CourseRecord] = field(default_factory=list)
+    
+    def addCourse(self, course:CourseRecord):
+        self.courses.append(course)
+    
+    def courseCount(self):
+        return len(self.courses)
+    
+    def toModel(self) -> Semester:
+        return Semester(year=self.year, term=self.term, courses=[c.toModel() for c in self.courses])
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 import json
 import os
 
@@ -11,40 +11,31 @@ class Transfer(BaseModel):
     effective_start:str
     effective_end:str | None
     
-    def __init__(__pydantic_self__, **data: any) -> None:
-        super().__init__(**data)
-        
-    
-    class Config:
-        json_schema_extra = {
-            "example1": {
-                 "subject": "CPSC",
-                "course_code": 1050,
-                "source": "LANG",
-                "destination": "ALEX",
-                "credit": "ALEX CPSC 1XX (3)",
-                "effective_start": "Sep/15",
-                "effective_end": "present"
-            },
-            "example2": {
-                "subject": "CPSC",
-                "course_code": 1050,
-                "source": "LANG",
-                "destination": "AU",
-                "credit": "AU COMP 2XX (3)",
-                "effective_start": "May/15",
-                "effective_end": "present"
-            }
+    model_config = ConfigDict(json_schema_extra = {
+        "example1": {
+            "subject": "CPSC",
+            "course_code": 1050,
+            "source": "LANG",
+            "destination": "ALEX",
+            "credit": "ALEX CPSC 1XX (3)",
+            "effective_start": "Sep/15",
+            "effective_end": "present"
+        },
+        "example2": {
+            "subject": "CPSC",
+            "course_code": 1050,
+            "source": "LANG",
+            "destination": "AU",
+            "credit": "AU COMP 2XX (3)",
+            "effective_start": "May/15",
+            "effective_end": "present"
         }
-        
-        
-        
+    })
+
+TransferList = TypeAdapter(list[Transfer])
     
 class Transfers(BaseModel):
     courses:list[Transfer]
-
-    def __init__(__pydantic_self__, **data: any) -> None:
-        super().__init__(**data)
         
     def toJSON(self):
         # ugly but neccessary to pretty print the json file
@@ -1,116 +1,379 @@
-from concurrent.futures import Future
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
+from parsers.SemesterParser import mergeSemesterHTML
+
+import asyncio
 import concurrent.futures
+import datetime
+import queue
+import threading
+import time
+from typing import AsyncIterator, Iterable
 
-def getSubjectsFromWeb(year:int, semester:int) -> list | None:
-    
-    # get available subjects (ie ABST, ANTH, APPL, etc)
-    url = f"https://swing.langara.bc.ca/prod/hzgkfcls.P_Sel_Crse_Search?term={year}{semester}"
-    i = requests.post(url)
-    
-    # TODO: optimize finding this list
-    soup = BeautifulSoup(i.text, "lxml")
-    courses = soup.find("select", {"id":"subj_id"})
-    courses = courses.findChildren()
-    subjects = []
-    for c in courses: # c = ['<option value=', 'SPAN', '>Spanish</option>']
-        subjects.append(str(c).split('"')[1])
+# Every page we download lives under here
+BASE_URL = "https://swing.langara.bc.ca/prod/"
+
+'''
+Token bucket rate limiter, shared by every thread making requests.
+
+Allows bursts of up to `burst` requests, then refills at `rate` requests per second.
+'''
+class RateLimiter:
+    def __init__(self, rate:float, burst:int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
     
-    if len(subjects) == 0:
-        print(f"No sections found for {year}{semester}.")
-        return None
+    # Blocks until a request is allowed
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait = (1 - self.tokens) / self.rate
+            
+            time.sleep(wait)
 
-    print(f"{year}{semester} : {len(subjects)} subjects found.")
+'''
+Downloads pages from the Langara SIS.
 
-    return subjects
+All requests go through one requests.Session so connections are kept alive and reused,
+at most max_connections requests are in flight at once and requests are rate limited so we don't DDOS Langara.
+Timeouts, connection errors and 429 / 5xx responses are retried with exponential backoff.
+
+base_url can be pointed at a local server for testing.
+'''
+class SISDownloader:
+    
+    RETRY_STATUS = [429, 500, 502, 503, 504]
+    
+    def __init__(self, base_url=BASE_URL, max_connections=8, rate=4.0, burst=4, retries=4, backoff=1.0, timeout=120) -> None:
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        self.limiter = RateLimiter(rate, burst)
+        self.connections = threading.BoundedSemaphore(max_connections)
+        
+        # how many requests have been sent, including retries
+        self.requests = 0
     
+    def post(self, page:str, **kwargs) -> requests.Response:
+        for attempt in range(self.retries + 1):
+            last_try = attempt == self.retries
+            
+            with self.connections:
+                self.limiter.acquire()
+                self.requests += 1
+                
+                try:
+                    response = self.session.post(self.base_url + page, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if last_try:
+                        raise
+                    print(f"Request to {page} failed ({e}), retrying.")
+                    response = None
+            
+            if response is not None:
+                if response.status_code not in SISDownloader.RETRY_STATUS or last_try:
+                    response.raise_for_status()
+                    return response
+                print(f"Request to {page} returned {response.status_code}, retrying.")
+            
+            time.sleep(self.backoff * 2 ** attempt)
+    
+    def getSubjects(self, year:int, semester:int) -> list | None:
+        
+        # get available subjects (ie ABST, ANTH, APPL, etc)
+        i = self.post(f"hzgkfcls.P_Sel_Crse_Search?term={year}{semester}")
+        
+        # TODO: optimize finding this list
+        soup = BeautifulSoup(i.text, "lxml")
+        courses = soup.find("select", {"id":"subj_id"})
+        subjects = []
+        if courses is not None:
+            for c in courses.findChildren(): # c = ['<option value=', 'SPAN', '>Spanish</option>']
+                subjects.append(str(c).split('"')[1])
+        
+        if len(subjects) == 0:
+            print(f"No sections found for {year}{semester}.")
+            return None
 
-def fetchTermFromWeb(year:int, term:int, subjects:list[str] = None) -> tuple[int, int, str, str, str] | None:
-    print(f"{year}{term} : Downloading data.")
+        print(f"{year}{semester} : {len(subjects)} subjects found.")
+
+        return subjects
     
-    if subjects == None:
-        subjects = getSubjectsFromWeb(year, term)
+    # shard_size downloads sections for that many subjects per request instead of all at once (see fetchSectionShards)
+    def fetchTerm(self, year:int, term:int, subjects:list[str] = None, shard_size:int = None) -> tuple[int, int, str, str, str] | None:
+        print(f"{year}{term} : Downloading data.")
+        
         if subjects == None:
-            return None
+            subjects = self.getSubjects(year, term)
+            if subjects == None:
+                return None
+        
+        if shard_size == None:
+            sections = self.fetchSections(year, term, subjects)
+        else:
+            # stored the same as a page from one request
+            sections = mergeSemesterHTML(self.fetchSectionShards(year, term, subjects, shard_size))
+        
+        catalogue = self.post(f"hzgkcald.P_DisplayCatalog?term_in={year}{term}")
+        
+        attributes = self.post(f"hzgkcald.P_DispCrseAttr?term_in={year}{term}")
+        
+        return (year, term, sections, catalogue.text, attributes.text)
+    
+    # Downloads the course search page with the sections of the given subjects
+    def fetchSections(self, year:int, term:int, subjects:list[str]) -> str:
+        subjects_data = ""
+        for s in subjects:
+            subjects_data += f"&sel_subj={s}"
+        
+        headers = {'Content-type': 'application/x-www-form-urlencoded'}
+        data = f"term_in={year}{term}&sel_subj=dummy&sel_day=dummy&sel_schd=dummy&sel_insm=dummy&sel_camp=dummy&sel_levl=dummy&sel_sess=dummy&sel_instr=dummy&sel_ptrm=dummy&sel_attr=dummy&sel_dept=dummy{subjects_data}&sel_crse=&sel_title=%25&sel_dept=%25&begin_hh=0&begin_mi=0&begin_ap=a&end_hh=0&end_mi=0&end_ap=a&sel_incl_restr=Y&sel_incl_preq=Y&SUB_BTN=Get+Courses"
+        sections = self.post("hzgkfcls.P_GetCrse", headers=headers, data=data)
+        
+        return sections.text
+    
+    # Downloads sections in batches of shard_size subjects in parallel, instead of one huge request for every subject
+    # Each shard is retried on its own, so one failure doesn't throw away the whole term
+    # Returns one page per shard, in the same order as subjects
+    def fetchSectionShards(self, year:int, term:int, subjects:list[str], shard_size=10, shard_retries=2) -> list[str]:
+        shards = [subjects[i:i+shard_size] for i in range(0, len(subjects), shard_size)]
+        
+        def fetchShard(shard:list[str]) -> str:
+            for attempt in range(shard_retries + 1):
+                try:
+                    return self.fetchSections(year, term, shard)
+                except requests.RequestException as e:
+                    if attempt == shard_retries:
+                        raise
+                    print(f"{year}{term} : Shard {shard[0]}-{shard[-1]} failed ({e}), retrying.")
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            return list(executor.map(fetchShard, shards))
+    
+    # Downloads terms concurrently, yielding (year, term, sectionHTML, catalogueHTML, attributeHTML) as each one finishes
+    # Terms with no sections are skipped
+    async def iterTerms(self, terms:Iterable[tuple[int, int]]) -> AsyncIterator[tuple[int, int, str, str, str]]:
+        async for r in self._iterTerms(iter(terms)):
+            if r[2] is not None:
+                yield r[2]
+    
+    # Downloads every term from start onwards until a term with no sections is found
+    # Terms in skip are not downloaded (see frozenTerms)
+    async def iterAllTerms(self, year=1999, term=20, skip:set[tuple[int, int]] = set()) -> AsyncIterator[tuple[int, int, str, str, str]]:
+        # first term with no data, nothing after it is downloaded
+        end = None
+        
+        def terms():
+            nonlocal year, term
+            while end is None or (year, term) < end:
+                if (year, term) not in skip:
+                    yield year, term
+                year, term = nextTerm(year, term)
         
-    subjects_data = ""
-    for s in subjects:
-        subjects_data += f"&sel_subj={s}"
+        generator = terms()
+        async for y, t, r in self._iterTerms(generator):
+            if r is None:
+                if end is None or (y, t) < end:
+                    end = (y, t)
+                    print(f"{y}{t}: No data found. Subject search is complete.")
+                continue
+            
+            # terms after the end may have been started before the end was found
+            if end is None or (y, t) < end:
+                yield r
     
-    url = "https://swing.langara.bc.ca/prod/hzgkfcls.P_GetCrse"
-    headers = {'Content-type': 'application/x-www-form-urlencoded'}
-    data = f"term_in={year}{term}&sel_subj=dummy&sel_day=dummy&sel_schd=dummy&sel_insm=dummy&sel_camp=dummy&sel_levl=dummy&sel_sess=dummy&sel_instr=dummy&sel_ptrm=dummy&sel_attr=dummy&sel_dept=dummy{subjects_data}&sel_crse=&sel_title=%25&sel_dept=%25&begin_hh=0&begin_mi=0&begin_ap=a&end_hh=0&end_mi=0&end_ap=a&sel_incl_restr=Y&sel_incl_preq=Y&SUB_BTN=Get+Courses"
-    sections = requests.post(url, headers=headers, data=data)
+    # Runs fetchTerm in worker threads with at most max_connections terms in flight, yielding (year, term, result)
+    async def _iterTerms(self, terms:Iterable[tuple[int, int]]):
+        pending:dict[asyncio.Future, tuple[int, int]] = {}
+        exhausted = False
+        
+        while True:
+            while not exhausted and len(pending) < self.max_connections:
+                t = next(terms, None)
+                if t is None:
+                    exhausted = True
+                    break
+                pending[asyncio.ensure_future(asyncio.to_thread(self.fetchTerm, t[0], t[1]))] = t
+            
+            if len(pending) == 0:
+                return
+            
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for d in done:
+                year, term = pending.pop(d)
+                yield year, term, d.result()
+
+
+# Shared by the module level functions below
+_downloader:SISDownloader = None
+
+def getDownloader() -> SISDownloader:
+    global _downloader
+    if _downloader is None:
+        _downloader = SISDownloader()
+    return _downloader
+
+def nextTerm(year:int, term:int) -> tuple[int, int]:
+    if term == 10:
+        return year, 20
+    if term == 20:
+        return year, 30
+    return year + 1, 10
+
+# The term that is running on a date (today by default)
+def currentTerm(date:datetime.date = None) -> tuple[int, int]:
+    if date is None:
+        date = datetime.date.today()
     
-    url = f"https://swing.langara.bc.ca/prod/hzgkcald.P_DisplayCatalog?term_in={year}{term}"
-    catalogue = requests.post(url)
+    if date.month <= 4:
+        return date.year, 10
+    if date.month <= 8:
+        return date.year, 20
+    return date.year, 30
+
+# Stored terms that ended long enough ago that they won't change anymore
+# A term is frozen if it is more than horizon terms before the current term
+def frozenTerms(stored:Iterable[tuple[int, int]], horizon=3, date:datetime.date = None) -> set[tuple[int, int]]:
+    def index(yt:tuple[int, int]) -> int:
+        return yt[0] * 3 + yt[1] // 10
     
-    url = f"https://swing.langara.bc.ca/prod/hzgkcald.P_DispCrseAttr?term_in={year}{term}"
-    attributes = requests.post(url)
+    cutoff = index(currentTerm(date)) - horizon
+    return set(yt for yt in stored if index(yt) < cutoff)
+
+# each term needs the subject list, sections, catalogue and attributes
+REQUESTS_PER_TERM = 4
+
+def getSubjectsFromWeb(year:int, semester:int, downloader:SISDownloader = None) -> list | None:
+    if downloader is None:
+        downloader = getDownloader()
+    return downloader.getSubjects(year, semester)
     
-    return (year, term, sections.text, catalogue.text, attributes.text)
 
-# uses multiple threads for increased speed: https://stackoverflow.com/a/68583332/5994461 
-# may get rid of the function in method declaration later
-def DownloadAllTermsFromWeb(function, multithread=True, max_threads=3*8) -> list[tuple[int, int, str]]:
+def fetchTermFromWeb(year:int, term:int, subjects:list[str] = None, downloader:SISDownloader = None, shard_size:int = None) -> tuple[int, int, str, str, str] | None:
+    if downloader is None:
+        downloader = getDownloader()
+    return downloader.fetchTerm(year, term, subjects, shard_size)
+
+def fetchSectionShardsFromWeb(year:int, term:int, subjects:list[str], shard_size=10, downloader:SISDownloader = None) -> list[str]:
+    if downloader is None:
+        downloader = getDownloader()
+    return downloader.fetchSectionShards(year, term, subjects, shard_size)
+
+# Downloads every term with a pool of max_threads workers and hands each one to function as it arrives
+#
+# download workers -> bounded queue -> function (called from this thread only, so it can safely write to the database)
+#
+# Workers look up subjects themselves, so terms are discovered in parallel. The first term with no data stops the download.
+# When function falls behind, the queue fills up and the workers wait, so at most max_threads + queue_size terms are held in memory.
+# Terms in skip are not downloaded (see frozenTerms).
+# Set keep_results=False to not keep every term's HTML around to return.
+# By default the workers get their own SISDownloader with a connection each, requests are still rate limited by it.
+# A downloader that is passed in caps how many requests are in flight at its own max_connections, whatever max_threads is.
+def DownloadAllTermsFromWeb(function, multithread=True, max_threads=3*8, skip:set[tuple[int, int]] = set(), keep_results=True, queue_size:int = None, downloader:SISDownloader = None) -> list[tuple[int, int, str, str, str]]:
     HTML = []
-    year = 1999 # this is the furthest back the SIS has records for.
-    term = 20
     
-    pool = concurrent.futures.ThreadPoolExecutor()
     if multithread == False:
         max_threads = 1
-    pool._max_workers = max_threads # Don't DDOS Langara
-    futures:list[Future] = []
+    if queue_size is None:
+        queue_size = max_threads
+    if downloader is None:
+        downloader = SISDownloader(max_connections=max_threads)
     
-    with pool as executor:
-        while True:
-            
-            # not multi threaded because it is pretty cheap
-            subjects = getSubjectsFromWeb(year, term)
+    results = queue.Queue(maxsize=queue_size)
+    DONE = object()
+    
+    # set once a term with no data is found, or something went wrong
+    stop = threading.Event()
+    # only start a term when a worker is free to download it
+    workers = threading.BoundedSemaphore(max_threads)
+    skipped = 0
+    
+    def download(year, term):
+        try:
+            r = fetchTermFromWeb(year, term, downloader=downloader)
             
-            if subjects == None:
+            if r == None:
                 print(f"{year}{term}: No data found. Subject search is complete.")
-                break
-            
-            future = executor.submit(fetchTermFromWeb, year, term, subjects)
-            futures.append(future)
-            
-            if term == 10:
-                term = 20
-            elif term == 20:
-                term = 30
-            elif term == 30:
-                term = 10
-                year += 1 
-            
-            def retrieveDownloads(futures:list[Future], arr:list, function):     
+                stop.set()
+            else:
+                results.put(r)
+        except BaseException as e:
+            stop.set()
+            results.put(e)
+        finally:
+            workers.release()
+    
+    def produce():
+        nonlocal skipped
+        year = 1999 # this is the furthest back the SIS has records for.
+        term = 20
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor: # Don't DDOS Langara
+            while not stop.is_set():
                 
-                for f in reversed(futures):
-                    if f.done():
-                        r = f.result()
-                        
-                        function(r[0], r[1], r[2], r[3], r[4])
-                        arr.append((r[0], r[1], r[2], r[3], r[4]))
-                        print(f"{r[0]}{r[1]} : HTML downloaded.")
-                        
-                        futures.remove(f)
-            
-            retrieveDownloads(futures, HTML, function)
-            
+                if (year, term) in skip:
+                    skipped += 1
+                    year, term = nextTerm(year, term)
+                    continue
                 
-        while True:
+                workers.acquire()
+                if stop.is_set():
+                    workers.release()
+                    break
                 
-            # wait for all HTML requests to finish
-            tup = concurrent.futures.wait(futures, timeout=1)
-            
-            # Do one final retrieval
-            retrieveDownloads(futures, HTML, function)
+                executor.submit(download, year, term)
+                year, term = nextTerm(year, term)
+        
+        results.put(DONE)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    
+    try:
+        while True:
+            r = results.get()
             
-            # tup contains 2 sets - done & not_done - once not_done is empty we can exit
-            if len(tup[1]) == 0:
+            if r is DONE:
                 break
+            if isinstance(r, BaseException):
+                raise r
+            
+            function(r[0], r[1], r[2], r[3], r[4])
+            if keep_results:
+                HTML.append(r)
+            print(f"{r[0]}{r[1]} : HTML downloaded.")
+    finally:
+        stop.set()
+        # keep draining so workers blocked on a full queue can finish and the pool can shut down
+        while producer.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    
+    if skipped > 0:
+        print(f"Skipped {skipped} frozen terms ({skipped * REQUESTS_PER_TERM} requests).")
     
-    return HTML
\ No newline at end of file
+    return HTML
@@ -8,7 +8,8 @@ from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.firefox.options import Options
 
 import os
-import fitz
+
+from parsers.TransferParser import TransferParser
 
 class TransferScraper:
     def __init__(self, institution = "LANG", delay = 0.3, headless = True) -> None:
@@ -183,23 +184,22 @@ class TransferScraper:
         
             
     # Sends PDFs in /downloads to the database then maybe delete them
-    def sendPDFToDatabase(database, delete = True):
+    # Each PDF is decoded once with engine, the text is cached for rebuilds that use the same engine
+    def sendPDFToDatabase(database, delete = True, engine="pdfquery"):
         dir = "downloads/"
         pdfs = os.listdir(dir)
                         
         for i, p in enumerate(pdfs):
             
-            with fitz.open(dir+p) as pdf:
-                text = chr(12).join([page.get_text() for page in pdf])
+            with open(dir+p, "rb") as fi:
+                data = fi.read()
             
-            info = text[0:100].split()
-            subject = info[5]
-            agreements = info[7]
-            courses = info[11]
-            institutions = info[14]
+            text = TransferParser.extractText(data, engine)
+            subject = TransferParser.headerSubject(text)
             
-            with open(dir+p, "rb") as fi:
-                database.insertTransferPDF(subject, fi.read())
+            # keep the extracted text so rebuilds don't have to decode the pdf again
+            # (agreements, courses and institutions are read from it by the database)
+            database.insertTransferPDF(subject, data, text, engine)
                 
             #print(f"Inserted transfer agreements for {subject} into the database ({i+1}/{len(pdfs)}).")
         
@@ -209,13 +209,14 @@ class TransferScraper:
             for p in pdfs:
                 os.remove(dir+p)       
             
-    def retrieveAllPDFFromDatabase(database, path="downloads/"):
+    # subjects only retrieves the PDFs for those subjects
+    def retrieveAllPDFFromDatabase(database, path="downloads/", subjects:list[str] = None):
         dir = path
         
         # don't overwrite files
         # assert len(os.listdir(dir)) == 0, f"Empty {dir} before retrieving PDFs!"
     
-        pdfs = database.getAllTransferPDF()
+        pdfs = database.iterTransferPDF(subjects)
                 
         for p in pdfs:
             
@@ -0,0 +1,147 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from LangaraCourseInfo import ConflictIndex, Database
+from schema.Semester import CourseRecord, ScheduleRecord, SemesterRecord, dayMask, scheduleTypes, timeRange
+
+def session(type, days, time, start, end) -> ScheduleRecord:
+    return ScheduleRecord(type=scheduleTypes(type), days=days, time=time, start=start, end=end, room="A130", instructor="Jane Doe")
+
+def section(crn, *schedule) -> CourseRecord:
+    return CourseRecord(
+        RP=None, seats=10, waitlist=0, crn=crn, subject="CPSC", course_code=1000 + crn % 100, section=f"{crn % 1000:03}",
+        credits=3.0, title="Test Section", add_fees=None, rpt_limit=None, notes=None, schedule=list(schedule),
+    )
+
+def buildIndex(tmp_path, courses:list[CourseRecord]) -> ConflictIndex:
+    db = Database(str(tmp_path / "conflicts.db"))
+    
+    semester = SemesterRecord(2023, 30)
+    for c in courses:
+        semester.addCourse(c)
+    db.insertSemester(semester)
+    
+    return ConflictIndex(db, 2023, 30)
+
+# Every date a session meets on, or None for sessions without (valid) dates, which meet every week of the term
+def meetingDates(s:ScheduleRecord) -> set[date] | None:
+    try:
+        start, end = date.fromisoformat(s.start), date.fromisoformat(s.end)
+    except (TypeError, ValueError):
+        return None
+    
+    if end < start:
+        return None
+    
+    mask = dayMask(s.days)
+    return {start + timedelta(d) for d in range((end - start).days + 1) if mask & (1 << (start + timedelta(d)).weekday())}
+
+# Whether two sessions are ever in class at the same time, checked date by date
+def clash(a:ScheduleRecord, b:ScheduleRecord) -> bool:
+    (a_start, a_end), (b_start, b_end) = timeRange(a.time), timeRange(b.time)
+    if a_start is None or b_start is None or not dayMask(a.days) or not dayMask(b.days):
+        return False
+    
+    if not (a_start < b_end and b_start < a_end):
+        return False
+    
+    days = dayMask(a.days) & dayMask(b.days)
+    a_dates, b_dates = meetingDates(a), meetingDates(b)
+    
+    if a_dates is None and b_dates is None:
+        return days != 0
+    if a_dates is None or b_dates is None:
+        dates = b_dates if a_dates is None else a_dates
+        return any(days & (1 << d.weekday()) for d in dates)
+    return len(a_dates & b_dates) > 0
+
+def bruteForce(courses:list[CourseRecord], crns:list[int]) -> list[int]:
+    picked = [c for c in courses if c.crn in crns]
+    
+    return sorted(
+        c.crn for c in courses
+        if any(clash(a, b) for p in picked for a in p.schedule for b in c.schedule)
+    )
+
+# Hand-picked sections for each case the index has to get right
+def fixtureCourses() -> list[CourseRecord]:
+    return [
+        # 10:00-11:00 and 11:00-12:00 on the same days only touch
+        section(10001, session("Lecture", "M-W----", "1000-1100", "2023-09-05", "2023-12-01")),
+        section(10002, session("Lecture", "M-W----", "1100-1200", "2023-09-05", "2023-12-01")),
+        # split-term sections at the same time, one in each half of the term, and one overlapping both
+        section(10003, session("Lecture", "-T-R---", "1430-1620", "2023-09-05", "2023-10-13")),
+        section(10004, session("Lecture", "-T-R---", "1430-1620", "2023-10-16", "2023-12-01")),
+        section(10005, session("Seminar", "-T-----", "1530-1720", "2023-10-10", "2023-10-10")),
+        # single date exams, on a Tuesday that is one of their days and on a Tuesday that isn't
+        section(10006,
+            session("Lecture", "---R---", "0830-1020", "2023-09-05", "2023-12-01"),
+            session("Exam", "-T-----", "1000-1200", "2023-12-05", "2023-12-05"),
+        ),
+        section(10007, session("Exam", "M------", "1000-1200", "2023-12-05", "2023-12-05")),
+        section(10008, session("Lecture", "-T-----", "1100-1300", "2023-11-28", "2023-12-12")),
+        # undated sessions run for the whole term
+        section(10009, session("Lab", "----F--", "1430-1620", None, None)),
+        section(10010, session("Lab", "----F--", "1500-1600", "2023-11-03", "2023-11-03")),
+        section(10011, session("Lab", "M------", "1000-1030", "TBA", "TBA")),
+        # no days or no time never conflicts
+        section(10012, session("WWW", "-------", "1000-1200", "2023-09-05", "2023-12-01")),
+        section(10013, session("WWW", "M-W----", "-", "2023-09-05", "2023-12-01")),
+    ]
+
+def test_conflicts_on_fixture(tmp_path):
+    courses = fixtureCourses()
+    index = buildIndex(tmp_path, courses)
+    
+    # back to back
+    assert index.conflictingCRNs([10001]) == [10001, 10011]
+    assert index.conflictingCRNs([10002]) == [10002]
+    # split term halves only meet the seminar that falls in the first half
+    assert index.conflictingCRNs([10003]) == [10003, 10005]
+    assert index.conflictingCRNs([10004]) == [10004]
+    # the exam on its day meets the Tuesday lecture running that week, the one on the wrong day never meets
+    assert index.conflictingCRNs([10006]) == [10006, 10008]
+    assert index.conflictingCRNs([10007]) == []
+    # undated labs meet every Friday, including a single date
+    assert index.conflictingCRNs([10009]) == [10009, 10010]
+    assert index.conflictingCRNs([10012, 10013]) == []
+    
+    crns = [c.crn for c in courses]
+    for a in crns:
+        assert index.conflictingCRNs([a]) == bruteForce(courses, [a]), a
+        for b in crns:
+            assert index.conflictingCRNs([a, b]) == bruteForce(courses, [a, b]), (a, b)
+
+def randomSession(rng:random.Random) -> ScheduleRecord:
+    start = date(2023, 9, 4) + timedelta(rng.randrange(90))
+    
+    kind = rng.random()
+    if kind < 0.15:
+        # exam on a single date, half of them on a day they aren't listed for
+        days = rng.choice(["M------", "-T-----", "--W----", "---R---", "----F--"])
+        return session("Exam", days, rng.choice(["0900-1200", "1200-1500"]), start.isoformat(), start.isoformat())
+    elif kind < 0.25:
+        dates = rng.choice([(None, None), ("TBA", "TBA"), ("2023-12-01", "2023-09-05")])
+    else:
+        dates = (start.isoformat(), (start + timedelta(rng.randrange(1, 60))).isoformat())
+    
+    days = "".join(d if rng.random() < 0.3 else "-" for d in "MTWRFSU")
+    hour = rng.randrange(8, 18)
+    time = f"{hour:02}{rng.choice(['00', '30'])}-{hour + rng.randrange(1, 3):02}{rng.choice(['00', '20', '30'])}"
+    return session(rng.choice(["Lecture", "Lab", "Seminar"]), days, time, *dates)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_conflicts_match_brute_force(tmp_path, seed):
+    rng = random.Random(seed)
+    courses = [section(20000 + i, *[randomSession(rng) for _ in range(rng.randrange(1, 4))]) for i in range(60)]
+    index = buildIndex(tmp_path, courses)
+    
+    crns = [c.crn for c in courses]
+    for a in crns:
+        assert index.conflictingCRNs([a]) == bruteForce(courses, [a]), a
+    
+    for _ in range(200):
+        picked = rng.sample(crns, rng.randrange(2, 5))
+        assert index.conflictingCRNs(picked) == bruteForce(courses, picked), picked
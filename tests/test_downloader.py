@@ -0,0 +1,242 @@
+import asyncio
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from scrapers.DownloadLangaraInfo import RateLimiter, SISDownloader
+
+SUBJECTS = ["CPSC", "MATH", "ENGL"]
+
+'''
+Stands in for the Langara SIS.
+
+Terms up to `last` have subjects, later ones have none. Every request is logged as (time, page, term),
+and `failures` holds status codes to send instead of the page, e.g. {"hzgkcald.P_DisplayCatalog": [503, 429]}.
+'''
+class FakeSIS(ThreadingHTTPServer):
+    def __init__(self, last=(2000, 20)) -> None:
+        super().__init__(("127.0.0.1", 0), FakeSISHandler)
+        self.last = last
+        self.failures:dict[str, list[int]] = {}
+        self.log:list[tuple[float, str, str]] = []
+        self.lock = threading.Lock()
+    
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/prod/"
+    
+    def pages(self, page:str) -> list[tuple[float, str, str]]:
+        return [r for r in self.log if r[1] == page]
+
+class FakeSISHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_POST(self):
+        body = urllib.parse.parse_qs(self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode())
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        page = url.path.rsplit("/", 1)[-1]
+        yearterm = (query.get("term") or query.get("term_in") or body.get("term_in"))[0]
+        
+        with self.server.lock:
+            self.server.log.append((time.monotonic(), page, yearterm))
+            failures = self.server.failures.get(page, [])
+            status = failures.pop(0) if len(failures) > 0 else 200
+        
+        if status != 200:
+            self.respond(status, "")
+        elif page == "hzgkfcls.P_Sel_Crse_Search":
+            if (int(yearterm[:4]), int(yearterm[4:])) <= self.server.last:
+                self.respond(200, '<select id="subj_id">' + "".join(f'<option value="{s}">{s}</option>' for s in SUBJECTS) + "</select>")
+            else:
+                self.respond(200, "<p>No classes were found that meet your search criteria</p>")
+        elif page == "hzgkfcls.P_GetCrse":
+            subjects = [s for s in body.get("sel_subj", []) if s != "dummy"]
+            self.respond(200, f"sections {yearterm} {' '.join(subjects)}")
+        elif page == "hzgkcald.P_DisplayCatalog":
+            self.respond(200, f"catalogue {yearterm}")
+        else:
+            self.respond(200, f"attributes {yearterm}")
+    
+    def respond(self, status, text):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+@pytest.fixture
+def sis():
+    server = FakeSIS()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+# Fast enough to not slow the tests down, small backoff so retries are quick
+def downloader(sis:FakeSIS, **kwargs) -> SISDownloader:
+    options = dict(rate=1000.0, burst=100, retries=3, backoff=0.01, timeout=5)
+    options.update(kwargs)
+    return SISDownloader(sis.url, **options)
+
+def allTerms(d:SISDownloader, **kwargs) -> list[tuple[int, int, str, str, str]]:
+    async def collect():
+        return [r async for r in d.iterAllTerms(**kwargs)]
+    return asyncio.run(collect())
+
+def test_fetch_term(sis):
+    d = downloader(sis)
+    
+    assert d.getSubjects(2000, 10) == SUBJECTS
+    assert d.fetchTerm(2000, 10) == (2000, 10, "sections 200010 CPSC MATH ENGL", "catalogue 200010", "attributes 200010")
+    assert d.fetchTerm(2000, 10, ["CPSC"]) == (2000, 10, "sections 200010 CPSC", "catalogue 200010", "attributes 200010")
+    assert d.fetchSectionShards(2000, 10, SUBJECTS, shard_size=2) == ["sections 200010 CPSC MATH", "sections 200010 ENGL"]
+
+def test_no_subjects_after_last_term(sis):
+    d = downloader(sis)
+    
+    assert d.getSubjects(2000, 30) is None
+    assert d.fetchTerm(2000, 30) is None
+    # nothing past the subject search is downloaded
+    assert [r[1] for r in sis.log] == ["hzgkfcls.P_Sel_Crse_Search"] * 2
+
+@pytest.mark.parametrize("status", SISDownloader.RETRY_STATUS)
+def test_retries_status(sis, status):
+    sis.failures["hzgkcald.P_DisplayCatalog"] = [status, status]
+    d = downloader(sis)
+    
+    assert d.post("hzgkcald.P_DisplayCatalog?term_in=200010").text == "catalogue 200010"
+    assert len(sis.pages("hzgkcald.P_DisplayCatalog")) == 3
+    assert d.requests == 3
+
+def test_retries_mixed_failures(sis):
+    sis.failures["hzgkfcls.P_Sel_Crse_Search"] = [503, 429, 500]
+    d = downloader(sis)
+    
+    assert d.getSubjects(2000, 10) == SUBJECTS
+    assert d.requests == 4
+
+def test_backoff_doubles(sis):
+    sis.failures["hzgkcald.P_DispCrseAttr"] = [503, 503, 503]
+    d = downloader(sis, backoff=0.1)
+    
+    d.post("hzgkcald.P_DispCrseAttr?term_in=200010")
+    
+    times = [r[0] for r in sis.pages("hzgkcald.P_DispCrseAttr")]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert len(gaps) == 3
+    for attempt, gap in enumerate(gaps):
+        # 0.1, 0.2 then 0.4 seconds, with some slack for the request itself
+        assert 0.1 * 2 ** attempt <= gap < 0.1 * 2 ** attempt + 0.15
+
+def test_gives_up_after_retries(sis):
+    sis.failures["hzgkcald.P_DisplayCatalog"] = [503] * 10
+    d = downloader(sis, retries=2)
+    
+    with pytest.raises(requests.HTTPError) as e:
+        d.post("hzgkcald.P_DisplayCatalog?term_in=200010")
+    
+    assert e.value.response.status_code == 503
+    assert len(sis.pages("hzgkcald.P_DisplayCatalog")) == 3
+
+def test_client_errors_are_not_retried(sis):
+    sis.failures["hzgkcald.P_DisplayCatalog"] = [404]
+    d = downloader(sis)
+    
+    with pytest.raises(requests.HTTPError):
+        d.post("hzgkcald.P_DisplayCatalog?term_in=200010")
+    
+    assert len(sis.pages("hzgkcald.P_DisplayCatalog")) == 1
+
+def test_retries_connection_errors():
+    # nothing is listening on the port once the server is closed
+    server = FakeSIS()
+    server.server_close()
+    d = SISDownloader(server.url, rate=1000.0, burst=100, retries=2, backoff=0.01, timeout=5)
+    
+    with pytest.raises(requests.ConnectionError):
+        d.post("hzgkcald.P_DisplayCatalog?term_in=200010")
+    
+    assert d.requests == 3
+
+def test_iter_all_terms_stops_at_first_empty_term(sis):
+    d = downloader(sis, max_connections=4)
+    
+    terms = allTerms(d)
+    
+    assert sorted((r[0], r[1]) for r in terms) == [(1999, 20), (1999, 30), (2000, 10), (2000, 20)]
+    assert all(r[2] == f"sections {r[0]}{r[1]} CPSC MATH ENGL" for r in terms)
+    # at most max_connections terms are started before the end is found
+    searched = sorted(set(r[2] for r in sis.pages("hzgkfcls.P_Sel_Crse_Search")))
+    assert searched[:5] == ["199920", "199930", "200010", "200020", "200030"]
+    assert len(searched) <= 5 + 4
+    # terms after the end never get further than the subject search
+    assert all(r[2] <= "200020" for r in sis.log if r[1] != "hzgkfcls.P_Sel_Crse_Search")
+
+def test_iter_all_terms_skips_terms(sis):
+    d = downloader(sis, max_connections=2)
+    
+    terms = allTerms(d, year=1999, term=30, skip={(2000, 10)})
+    
+    assert sorted((r[0], r[1]) for r in terms) == [(1999, 30), (2000, 20)]
+    assert "200010" not in [r[2] for r in sis.log]
+
+def test_iter_all_terms_retries(sis):
+    sis.failures["hzgkfcls.P_GetCrse"] = [503, 502]
+    d = downloader(sis, max_connections=1)
+    
+    terms = allTerms(d, year=2000, term=10)
+    
+    assert [(r[0], r[1]) for r in terms] == [(2000, 10), (2000, 20)]
+
+def test_rate_limiter_burst_then_rate():
+    limiter = RateLimiter(rate=50.0, burst=5)
+    
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.05
+    
+    for _ in range(10):
+        limiter.acquire()
+    # the 10 after the burst come in at 50 per second
+    assert 0.2 - 0.01 <= time.monotonic() - start < 0.2 + 0.1
+
+def test_rate_limiter_is_shared_between_threads():
+    limiter = RateLimiter(rate=100.0, burst=1)
+    times = []
+    lock = threading.Lock()
+    
+    def worker():
+        for _ in range(5):
+            limiter.acquire()
+            with lock:
+                times.append(time.monotonic())
+    
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    # 20 requests, the first one from the burst, then 100 per second across every thread
+    assert len(times) == 20
+    assert max(times) - start >= 0.19 - 0.01
+
+def test_downloader_is_rate_limited(sis):
+    d = downloader(sis, rate=20.0, burst=2)
+    
+    for _ in range(6):
+        d.post("hzgkcald.P_DisplayCatalog?term_in=200010")
+    
+    times = [r[0] for r in sis.pages("hzgkcald.P_DisplayCatalog")]
+    # 2 from the burst, then 4 at 20 per second
+    assert times[-1] - times[0] >= 0.2 - 0.02
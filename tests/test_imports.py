@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+# Importing LangaraCourseInfo only loads the database and the schema, scrapers and parsers are loaded on first use
+def test_import_is_light():
+    code = """
+import sys
+import LangaraCourseInfo
+print(",".join(m for m in ("parsers.TransferParser", "parsers.SemesterParser", "scrapers.DownloadLangaraInfo", "scrapers.DownloadTransferInfo", "selenium", "bs4", "fitz", "pdfquery") if m in sys.modules))
+"""
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+    assert loaded == ""
+
+# Storing and reading PDFs and cached text doesn't need a PDF engine
+def test_database_doesnt_load_pdf_engines(tmp_path):
+    code = f"""
+import sys
+from LangaraCourseInfo import Database
+db = Database({str(tmp_path / "pdfs.db")!r})
+db.insertTransferPDF("CPSC", b"%PDF-1.4")
+db.insertTransferText("CPSC", "pdfquery", "hash", ["text"], 1, 2, 3)
+db.getTransferText("CPSC", "pdfquery", "hash")
+db.compressStoredFiles()
+print(",".join(m for m in ("fitz", "pymupdf", "pdfquery", "pdfminer") if m in sys.modules))
+"""
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+    assert loaded == ""
+
+def test_old_names_still_importable():
+    from LangaraCourseInfo import TransferParser, CatalogueParser, AttributesParser, parseSemesterHTML, DownloadAllTermsFromWeb
+    from parsers.TransferParser import TransferParser as parser
+    
+    assert TransferParser is parser
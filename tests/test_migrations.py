@@ -0,0 +1,94 @@
+import sqlite3
+
+from LangaraCourseInfo import Database, sourceHash
+from schema.Transfer import Transfer
+
+# Layout of the derived tables before schema versions existed (user_version 0)
+V1_TABLES = [
+    """CREATE TABLE TransferInformation(
+        subject, course_code, source, destination, credit, effective_start, effective_end,
+        PRIMARY KEY (subject, course_code, source, destination, effective_start, effective_end)
+    );""",
+    """CREATE TABLE CourseInfo(
+        subject TEXT, course_code INTEGER, credits REAL, title TEXT, description TEXT,
+        lecture_hours INTEGER, seminar_hours INTEGER, lab_hours INTEGER,
+        AR bool, SC bool, HUM bool, LSC bool, SCI bool, SOC bool, UT bool,
+        PRIMARY KEY (subject, course_code)
+    );""",
+    """CREATE TABLE Sections(
+        year, term, RP, seats, waitlist, crn, subject, course_code, section, credits, title, additional_fees, repeat_limit, notes,
+        PRIMARY KEY (year, term, crn)
+    );""",
+    """CREATE TABLE Schedules(
+        year, term, crn, type, days, time, start_date, end_date, room, instructor,
+        FOREIGN KEY (year, term, crn) REFERENCES Sections (year, term, crn)
+        PRIMARY KEY (year, term, crn, type, days, time, start_date, end_date, room, instructor)
+    );""",
+]
+
+TRANSFERS = [
+    ("CPSC", 1050, "LANG", "UBCV", "UBCV CPSC 1XX (3)", "Sep/15", "present"),
+    ("CPSC", 1050, "LANG", "SFU", "SFU CMPT 1XX (3)", "Sep/15", None),
+    ("MATH", 1171, "LANG", "UBCV", "UBCV MATH 100 (3)", "Jan/20", None),
+]
+
+def makeV1Database(path):
+    connection = sqlite3.connect(path)
+    for sql in V1_TABLES:
+        connection.execute(sql)
+    
+    connection.execute("INSERT INTO Sections VALUES(2023, 30, NULL, 8, 25, 30001, 'CPSC', 1050, '001', 3.0, 'Intro to Computer Science', NULL, NULL, NULL)")
+    connection.execute("INSERT INTO Schedules VALUES(2023, 30, 30001, 'Lecture', 'M-W----', '1030-1220', '2023-09-05', '2023-12-01', 'A136B', 'Jane Doe')")
+    connection.execute("INSERT INTO Schedules VALUES(2023, 30, 30001, 'Exam', '-------', ' ', '2023-12-10', '2023-12-10', ' ', 'Jane Doe')")
+    connection.executemany("INSERT INTO TransferInformation VALUES(?, ?, ?, ?, ?, ?, ?)", TRANSFERS)
+    connection.commit()
+    connection.close()
+
+def test_migrate_v1_with_null_end_dates(tmp_path):
+    path = tmp_path / "v1.db"
+    makeV1Database(path)
+    
+    db = Database(str(path))
+    
+    assert db.cursor.execute("PRAGMA user_version").fetchone()[0] == Database.SCHEMA_VERSION
+    
+    transfers = db.cursor.execute("SELECT * FROM TransferInformation").fetchall()
+    assert sorted(transfers, key=repr) == sorted(TRANSFERS, key=repr)
+    
+    sections = db.getSections(2023, 30)
+    assert list(sections) == [30001]
+    assert [(s.type.value, s.days, s.time) for s in sections[30001].schedule] == [("Lecture", "M-W----", "1030-1220"), ("Exam", "-------", " ")]
+    
+    # day masks and minutes are filled for migrated schedules too
+    assert list(db.findSections(2023, 30, days="W", start_after="1000")) == [30001]
+
+def test_insert_transfer_without_end_date(tmp_path):
+    db = Database(str(tmp_path / "new.db"))
+    
+    transfer = Transfer(subject="MATH", course_code=1171, destination="SFU", credit="SFU MATH 150 (4)", effective_start="Jan/20", effective_end=None)
+    db.insertTransfers([transfer])
+    db.replaceTransfers("MATH", [transfer])
+    
+    assert db.cursor.execute("SELECT * FROM TransferInformation").fetchall() == [("MATH", 1171, "LANG", "SFU", "SFU MATH 150 (4)", "Jan/20", None)]
+
+# SemesterHTML and TransferPDF from before their hashes were stored are hashed once when the database is opened
+def test_source_files_get_hashes(tmp_path):
+    path = tmp_path / "v1.db"
+    makeV1Database(path)
+    
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE SemesterHTML(year, term, sectionHTML TEXT, catalogueHTML TEXT, attributeHTML TEXT, PRIMARY KEY (year, term))")
+    connection.execute("CREATE TABLE TransferPDF(subject TEXT, pdf BLOB, PRIMARY KEY (subject))")
+    connection.execute("INSERT INTO SemesterHTML VALUES(2023, 30, '<html>sections</html>', '<html>catalogue</html>', NULL)")
+    connection.execute("INSERT INTO TransferPDF VALUES('CPSC', ?)", (b"%PDF-1.4",))
+    connection.commit()
+    connection.close()
+    
+    db = Database(str(path))
+    
+    assert db.getLangaraHTMLHashes() == {(2023, 30) : (sourceHash("<html>sections</html>"), sourceHash("<html>catalogue</html>", None))}
+    assert db.getTransferPDFHashes() == {"CPSC" : sourceHash(b"%PDF-1.4")}
+    assert db.getSemesterHTML(2023, 30) == ("<html>sections</html>", "<html>catalogue</html>", None)
+    
+    db.insertLangaraHTML(2023, 30, "<html>new sections</html>", "<html>catalogue</html>", None)
+    assert db.getLangaraHTMLHashes()[(2023, 30)][0] == sourceHash("<html>new sections</html>")
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from LangaraCourseInfo import Database
+from parsers.SemesterParser import parseSemesterHTML
+
+# Database with the stored SemesterHTML corpus to compare the section parser engines on
+CORPUS = os.environ.get("LCI_DATABASE", "LangaraCourseInfo.db")
+
+def corpusTerms() -> list[tuple[int, int]]:
+    if not os.path.exists(CORPUS):
+        return []
+    
+    db = Database(CORPUS, read_only=True)
+    return db.cursor.execute("SELECT year, term FROM SemesterHTML ORDER BY year, term").fetchall()
+
+def parseBoth(html) -> tuple[dict, dict]:
+    # datetime_retrieved is just when the object was made
+    expected = parseSemesterHTML(html, "bs4").model_dump(exclude={"datetime_retrieved"})
+    actual = parseSemesterHTML(html, "lxml").model_dump(exclude={"datetime_retrieved"})
+    return expected, actual
+
+HEADER = ["RP", "Seats", "Wait List", "Sel", "CRN", "Subj", "Crse", "Sec", "Cr", "Title", "Add'l Fees", "Rpt Lim",
+          "Type", "Days", "Time", "Start", "End", "Room", "Instructor(s)"]
+
+def row(*cells) -> str:
+    return "<tr>" + "".join(f'<td class="dbdefault">{c}</td>' for c in cells) + "</tr>"
+
+# Notes go in a row of their own under the section, after 9 empty cells
+def note(text) -> str:
+    return "<tr>" + '<td class="dbdefault">&nbsp;</td>' * 9 + f'<td class="dbdefault" colspan="10">{text}</td></tr>'
+
+# A course search page laid out like the one from langara.ca
+def semesterHTML() -> str:
+    rows = [
+        '<tr><td class="dehead" colspan="19">CPSC 1050</td></tr>',
+        "<tr>" + "".join(f'<td class="deheader">{h}</td>' for h in HEADER) + "</tr>",
+        # a section with a lecture twice a week, a lab and an exam
+        row("&nbsp;", "12", "3", "add", "30001", "CPSC", "1050", "001", "3.00", "Intro to Computing", "$34.50", "2",
+            "Lecture", "M-W----", "1030-1220", "05-Sep-23", "01-Dec-23", "A136B", "Jane Doe"),
+        row(*["&nbsp;"] * 12, "Lab", "----F--", "1430-1620", "05-Sep-23", "01-Dec-23", "B023", "Jane Doe"),
+        row(*["&nbsp;"] * 12, "Exam", "-------", "0900-1200", "12-Dec-23", "12-Dec-23", "C408", "&nbsp;"),
+        '<tr><td class="deseparator" colspan="19"></td></tr>',
+        # a section with a note
+        row("P", "Inact", "N/A", "add", "30002", "CPSC", "1050", "W01", "3.00", "Intro to Computing", "&nbsp;", "&nbsp;",
+            "WWW", "-------", "-", "05-Sep-23", "01-Dec-23", "WWW", "John Smith"),
+        note("This section has 2 hours as a WWW component."),
+        '<tr><td class="dbdefault" colspan="22">&nbsp;</td></tr>',
+        row(*["&nbsp;"] * 4),
+        '<tr><td class="deseparator" colspan="19"></td></tr>',
+        '<tr><td class="dehead" colspan="19">MATH 1171</td></tr>',
+        "<tr>" + "".join(f'<td class="deheader">{h}</td>' for h in HEADER) + "</tr>",
+        row("&nbsp;", "0", "Full", "add", "30003", "MATH", "1171", "002", "4.50", "Calculus I", "&nbsp;", "-",
+            "Lecture", "-T-R---", "0830-1020", "05-Sep-23", "01-Dec-23", "T210", "Wei Chen"),
+        '<tr><td class="deseparator" colspan="19"></td></tr>',
+    ]
+    
+    return f"""<html><head><title>Course Search</title></head><body>
+<h2>Course Search For Fall 2023</h2>
+<table class="dataentrytable">{''.join(rows)}</table></body></html>"""
+
+def test_engines_agree_on_fixture():
+    expected, actual = parseBoth(semesterHTML())
+    
+    assert expected == actual
+    
+    assert (expected["year"], expected["term"]) == (2023, 30)
+    assert [c["crn"] for c in expected["courses"]] == [30001, 30002, 30003]
+    assert [len(c["schedule"]) for c in expected["courses"]] == [3, 1, 1]
+    assert [c["notes"] for c in expected["courses"]] == [None, "This section has 2 hours as a WWW component.", None]
+    assert expected["courses"][0]["schedule"][1]["days"] == "----F--"
+    assert expected["courses"][0]["add_fees"] == 34.5
+
+# lxml only becomes the default engine once this passes for every stored term
+@pytest.mark.skipif(not os.path.exists(CORPUS), reason=f"no SemesterHTML corpus at {CORPUS} (set LCI_DATABASE)")
+@pytest.mark.parametrize("year, term", corpusTerms())
+def test_engines_agree_on_corpus(year, term):
+    db = Database(CORPUS, read_only=True)
+    
+    for html in db.iterLangaraHTML([(year, term)]):
+        expected, actual = parseBoth(html[2])
+        assert expected == actual
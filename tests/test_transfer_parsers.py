@@ -0,0 +1,104 @@
+import os
+
+import fitz
+import pytest
+
+from LangaraCourseInfo import Database, Utilities, sourceHash
+from parsers.TransferParser import TransferParser
+from schema.Transfer import Transfer
+
+# Database with the stored TransferPDF corpus to compare the PDF engines on
+CORPUS = os.environ.get("LCI_DATABASE", "LangaraCourseInfo.db")
+
+def corpusSubjects() -> list[str]:
+    if not os.path.exists(CORPUS):
+        return []
+    
+    db = Database(CORPUS, read_only=True)
+    return [subject for (subject,) in db.cursor.execute("SELECT subject FROM TransferPDF ORDER BY subject")]
+
+# PyMuPDF only becomes the default engine once this passes for every stored PDF
+@pytest.mark.skipif(not os.path.exists(CORPUS), reason=f"no TransferPDF corpus at {CORPUS} (set LCI_DATABASE)")
+@pytest.mark.parametrize("subject", corpusSubjects())
+def test_engines_agree_on_corpus(subject):
+    db = Database(CORPUS, read_only=True)
+    
+    for subject, pdf in db.iterTransferPDF([subject]):
+        assert Utilities.compareTransferPDF(subject, pdf) is None
+
+# A transfer PDF laid out like the ones from bctransferguide.ca
+# Each row is far enough from the next that pdfminer reads the table row by row, the way the parser expects
+def transferPDF(subject="CPSC") -> bytes:
+    doc = fitz.open()
+    page = doc.new_page()
+    
+    def put(x, y, *lines):
+        for i, text in enumerate(lines):
+            page.insert_text((x, y + i * 10), text, fontsize=8)
+    
+    put(40, 40, f"Course Search Result from Langara {subject} courses")
+    put(40, 70, "2 agreements found for 2 courses at 2 institutions")
+    put(40, 100, "Generated Apr 9, 2023")
+    put(500, 100, "1 of 1")
+    put(40, 130, "From")
+    put(150, 130, "To")
+    put(200, 130, "Transfer Credit")
+    put(300, 130, "Effective Date")
+    
+    put(40, 160, f"LANG {subject} 1050", "Intro to Computing", "Credits: 3", "Langara College (BC)")
+    put(150, 160, "SFU")
+    put(200, 160, "SFU CMPT 1XX (3)")
+    put(300, 160, "May/03 to", "present")
+    
+    put(40, 290, f"LANG {subject} 1150", "Credits: 3", "Langara College (BC)")
+    put(150, 290, "UBCV")
+    put(200, 290, "UBCV CPSC 110 (4)", "& UBCV CPSC 1st (1)")
+    put(300, 290, "Sep/15 to Aug/20")
+    
+    return doc.tobytes()
+
+def test_engines_parse_fixture(tmp_path):
+    expected = [
+        Transfer(subject="CPSC", course_code=1050, source="LANG", destination="SFU", credit="SFU CMPT 1XX (3)", effective_start="May/03", effective_end="present"),
+        Transfer(subject="CPSC", course_code=1150, source="LANG", destination="UBCV", credit="UBCV CPSC 110 (4) & UBCV CPSC 1st (1)", effective_start="Sep/15", effective_end="Aug/20"),
+    ]
+    pdf = transferPDF()
+    
+    assert TransferParser.extractTextPyMuPDF(pdf) == TransferParser.extractTextPdfquery(pdf)
+    assert TransferParser.parseTransferPDF(pdf, "pdfquery", "CPSC") == expected
+    assert TransferParser.parseTransferPDF(pdf, "pymupdf", "CPSC") == expected
+    
+    db = Database(str(tmp_path / "transfers.db"))
+    db.insertTransferPDF("CPSC", pdf)
+    assert Utilities(db).compareTransferParsers() == []
+
+# Text is cached separately for each engine, a rebuild never parses text another engine extracted
+def test_text_cache_is_per_engine(tmp_path):
+    db = Database(str(tmp_path / "transfers.db"))
+    pdf = transferPDF()
+    db.insertTransferPDF("CPSC", pdf, TransferParser.extractTextPyMuPDF(pdf), "pymupdf")
+    
+    assert db.getTransferText("CPSC", "pymupdf", sourceHash(pdf)) == TransferParser.extractTextPyMuPDF(pdf)
+    assert db.getTransferText("CPSC", "pdfquery", sourceHash(pdf)) is None
+    
+    db.insertTransferText("CPSC", "pdfquery", sourceHash(pdf), ["pdfquery text"], None, None, None)
+    
+    assert db.getTransferText("CPSC", "pdfquery", sourceHash(pdf)) == ["pdfquery text"]
+    assert db.getTransferText("CPSC", "pymupdf", sourceHash(pdf)) == TransferParser.extractTextPyMuPDF(pdf)
+
+# TransferText used to only hold PyMuPDF text, without an engine column
+def test_old_text_cache_is_kept_as_pymupdf(tmp_path):
+    path = str(tmp_path / "transfers.db")
+    db = Database(path)
+    db.insertTransferText("CPSC", "pymupdf", "hash", ["text"], 1, 2, 3)
+    db.connection.executescript("""
+        CREATE TABLE TransferText_v (subject TEXT, pdf_hash TEXT, extractor_version INTEGER, text BLOB, agreements INTEGER, courses INTEGER, institutions INTEGER, PRIMARY KEY (subject));
+        INSERT INTO TransferText_v SELECT subject, pdf_hash, extractor_version, text, agreements, courses, institutions FROM TransferText;
+        DROP TABLE TransferText;
+        ALTER TABLE TransferText_v RENAME TO TransferText;""")
+    db.connection.close()
+    
+    db = Database(path)
+    assert db.getTransferText("CPSC", "pymupdf", "hash") == ["text"]
+    assert db.getTransferText("CPSC", "pdfquery", "hash") is None
+    assert db.getTransferCounts() == {"CPSC" : (1, 2, 3)}